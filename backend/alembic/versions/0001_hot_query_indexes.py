@@ -0,0 +1,53 @@
+"""Indexes for hot chat, admin and analytics query patterns
+
+Revision ID: 0001_hot_query_indexes
+Revises:
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0001_hot_query_indexes"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+# (name, table, columns, partial predicate)
+INDEXES = [
+    # Message history per conversation, in order
+    ("ix_messages_conversation_id_created_at", "messages", "conversation_id, created_at", None),
+    # Per-user conversation lists ordered by start time
+    ("ix_conversations_user_id_started_at", "conversations", "user_id, started_at DESC", None),
+    # Analytics date ranges and admin lists ordered by start time
+    ("ix_conversations_started_at", "conversations", "started_at DESC", None),
+    # Admin list filtered by status
+    ("ix_conversations_status_started_at", "conversations", "status, started_at DESC", None),
+    # Active conversation count on the dashboard
+    ("ix_conversations_active", "conversations", "started_at", "status = 'ACTIVE'"),
+    # Application lookup for each chat turn
+    ("ix_loan_applications_conversation_id", "loan_applications", "conversation_id", None),
+    # Funnel date ranges and admin lists ordered by creation time
+    ("ix_loan_applications_created_at", "loan_applications", "created_at DESC", None),
+    # Admin list filtered by status; sanctioned totals
+    ("ix_loan_applications_status_created_at", "loan_applications", "status, created_at DESC", None),
+    # Time-to-sanction metrics only look at sanctioned applications
+    ("ix_loan_applications_sanctioned", "loan_applications", "created_at", "sanctioned_at IS NOT NULL"),
+    # Documents for an application
+    ("ix_documents_application_id_uploaded_at", "documents", "application_id, uploaded_at", None),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY avoids locking writes on large tables; it cannot run in a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            predicate = f" WHERE {where}" if where else ""
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns}){predicate}"
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,87 @@
+"""Convert string counters and scores to integer columns
+
+Revision ID: 0002_numeric_counter_columns
+Revises: 0001_hot_query_indexes
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002_numeric_counter_columns"
+down_revision = "0001_hot_query_indexes"
+branch_labels = None
+depends_on = None
+
+
+# (table, column, target type, is_counter)
+# Counters become NOT NULL DEFAULT 0; the rest stay nullable.
+COLUMNS = [
+    ("customer_profiles", "total_conversations", "INTEGER", True),
+    ("customer_profiles", "total_applications", "INTEGER", True),
+    ("customer_profiles", "successful_applications", "INTEGER", True),
+    ("loan_applications", "tenure_months", "INTEGER", False),
+    ("loan_applications", "credit_score", "INTEGER", False),
+    ("documents", "file_size", "BIGINT", False),
+    ("conversion_metrics", "total_conversations", "INTEGER", True),
+    ("conversion_metrics", "qualified_leads", "INTEGER", True),
+    ("conversion_metrics", "documents_submitted", "INTEGER", True),
+    ("conversion_metrics", "applications_submitted", "INTEGER", True),
+    ("conversion_metrics", "applications_approved", "INTEGER", True),
+    ("conversion_metrics", "sanctioned", "INTEGER", True),
+    ("agent_performance", "total_interactions", "INTEGER", True),
+    ("agent_performance", "successful_handoffs", "INTEGER", True),
+    ("agent_performance", "failed_handoffs", "INTEGER", True),
+    ("ab_tests", "variant_a_conversions", "INTEGER", True),
+    ("ab_tests", "variant_a_total", "INTEGER", True),
+    ("ab_tests", "variant_b_conversions", "INTEGER", True),
+    ("ab_tests", "variant_b_total", "INTEGER", True),
+]
+
+# Anything that is not a plain number (blank, "N/A", ...) becomes NULL
+NUMERIC_PATTERN = r"^\s*-?[0-9]+(\.[0-9]+)?\s*$"
+
+
+def _string_columns(table: str) -> set:
+    """Columns of `table` that are still character types (tables made by create_all are already converted)."""
+    if op.get_context().as_sql:
+        # Offline SQL generation cannot inspect; assume nothing is converted yet
+        return {column for t, column, _, _ in COLUMNS if t == table}
+    
+    inspector = sa.inspect(op.get_bind())
+    if not inspector.has_table(table):
+        return set()
+    return {
+        col["name"] for col in inspector.get_columns(table)
+        if isinstance(col["type"], sa.String)
+    }
+
+
+def upgrade() -> None:
+    pending = {}
+    for table, column, target, is_counter in COLUMNS:
+        if table not in pending:
+            pending[table] = _string_columns(table)
+        if column not in pending[table]:
+            continue
+        
+        op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} DROP DEFAULT")
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE {target} USING "
+            f"CASE WHEN {column} ~ '{NUMERIC_PATTERN}' "
+            f"THEN round({column}::numeric)::{target} END"
+        )
+        
+        if is_counter:
+            op.execute(f"UPDATE {table} SET {column} = 0 WHERE {column} IS NULL")
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET DEFAULT 0")
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL")
+
+
+def downgrade() -> None:
+    for table, column, _, is_counter in reversed(COLUMNS):
+        if is_counter:
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} DROP NOT NULL")
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN {column} DROP DEFAULT")
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE VARCHAR USING {column}::varchar"
+        )
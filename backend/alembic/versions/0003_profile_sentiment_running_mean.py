@@ -0,0 +1,39 @@
+"""Running sentiment count/sum on customer profiles
+
+Revision ID: 0003_profile_sentiment_running_mean
+Revises: 0002_numeric_counter_columns
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003_profile_sentiment_running_mean"
+down_revision = "0002_numeric_counter_columns"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE customer_profiles "
+        "ADD COLUMN IF NOT EXISTS sentiment_count INTEGER NOT NULL DEFAULT 0"
+    )
+    op.execute(
+        "ALTER TABLE customer_profiles "
+        "ADD COLUMN IF NOT EXISTS sentiment_sum NUMERIC(14, 6) NOT NULL DEFAULT 0"
+    )
+    
+    # Existing averages were computed over the (at most 50) stored entries
+    op.execute(
+        "UPDATE customer_profiles SET "
+        "sentiment_count = jsonb_array_length(sentiment_history), "
+        "sentiment_sum = COALESCE(average_sentiment_score, 0) * jsonb_array_length(sentiment_history) "
+        "WHERE sentiment_count = 0 "
+        "AND jsonb_typeof(sentiment_history) = 'array' "
+        "AND jsonb_array_length(sentiment_history) > 0"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("customer_profiles", "sentiment_sum")
+    op.drop_column("customer_profiles", "sentiment_count")
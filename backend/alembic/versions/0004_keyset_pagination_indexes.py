@@ -0,0 +1,55 @@
+"""Keyset pagination indexes on (timestamp DESC, id DESC)
+
+Revision ID: 0004_keyset_pagination_indexes
+Revises: 0003_profile_sentiment_running_mean
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0004_keyset_pagination_indexes"
+down_revision = "0003_profile_sentiment_running_mean"
+branch_labels = None
+depends_on = None
+
+
+# (new index, table, columns, index it supersedes)
+INDEXES = [
+    ("ix_loan_applications_created_at_id", "loan_applications",
+     "created_at DESC, id DESC", "ix_loan_applications_created_at"),
+    ("ix_loan_applications_status_created_at_id", "loan_applications",
+     "status, created_at DESC, id DESC", "ix_loan_applications_status_created_at"),
+    ("ix_conversations_started_at_id", "conversations",
+     "started_at DESC, id DESC", "ix_conversations_started_at"),
+    ("ix_conversations_status_started_at_id", "conversations",
+     "status, started_at DESC, id DESC", "ix_conversations_status_started_at"),
+    ("ix_conversations_user_id_started_at_id", "conversations",
+     "user_id, started_at DESC, id DESC", "ix_conversations_user_id_started_at"),
+    ("ix_users_created_at_id", "users",
+     "created_at DESC, id DESC", None),
+]
+
+# Columns of the superseded indexes, for downgrade
+PREVIOUS = {
+    "ix_loan_applications_created_at": ("loan_applications", "created_at DESC"),
+    "ix_loan_applications_status_created_at": ("loan_applications", "status, created_at DESC"),
+    "ix_conversations_started_at": ("conversations", "started_at DESC"),
+    "ix_conversations_status_started_at": ("conversations", "status, started_at DESC"),
+    "ix_conversations_user_id_started_at": ("conversations", "user_id, started_at DESC"),
+}
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns, replaces in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+            if replaces:
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {replaces}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _, replaces in reversed(INDEXES):
+            if replaces:
+                table, columns = PREVIOUS[replaces]
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {replaces} ON {table} ({columns})")
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
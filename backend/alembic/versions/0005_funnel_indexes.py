@@ -0,0 +1,34 @@
+"""Indexes for the single-pass conversion funnel
+
+Revision ID: 0005_funnel_indexes
+Revises: 0004_keyset_pagination_indexes
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0005_funnel_indexes"
+down_revision = "0004_keyset_pagination_indexes"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    # Stage lookups on the JSONB conversation state
+    ("ix_conversations_stage_started_at", "conversations",
+     "((conversation_state ->> 'stage'), started_at)"),
+    # Funnel over a created_at range reads status/submitted_at from the index
+    ("ix_loan_applications_funnel", "loan_applications",
+     "(created_at) INCLUDE (status, submitted_at)"),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, definition in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {definition}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
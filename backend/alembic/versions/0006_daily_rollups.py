@@ -0,0 +1,51 @@
+"""Daily rollup keys for conversion_metrics and agent_performance
+
+Revision ID: 0006_daily_rollups
+Revises: 0005_funnel_indexes
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0006_daily_rollups"
+down_revision = "0005_funnel_indexes"
+branch_labels = None
+depends_on = None
+
+
+# (unique key, table, columns, plain index it supersedes)
+INDEXES = [
+    ("ux_conversion_metrics_date", "conversion_metrics", "(date)",
+     "ix_conversion_metrics_date"),
+    ("ux_agent_performance_agent_type_date", "agent_performance", "(agent_type, date)",
+     "ix_agent_performance_agent_type"),
+]
+
+# Columns of the superseded indexes, for downgrade
+PREVIOUS = {
+    "ix_conversion_metrics_date": ("conversion_metrics", "date"),
+    "ix_agent_performance_agent_type": ("agent_performance", "agent_type"),
+}
+
+
+def upgrade() -> None:
+    op.execute(
+        "ALTER TABLE conversion_metrics "
+        "ADD COLUMN IF NOT EXISTS total_applications INTEGER NOT NULL DEFAULT 0"
+    )
+    
+    # Unique keys the rollup job upserts on; they also serve the plain
+    # indexes' lookups, which would only slow the upserts down
+    with op.get_context().autocommit_block():
+        for name, table, columns, replaces in INDEXES:
+            op.execute(f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} {columns}")
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {replaces}")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _, replaces in reversed(INDEXES):
+            table, columns = PREVIOUS[replaces]
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {replaces} ON {table} ({columns})")
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    
+    op.drop_column("conversion_metrics", "total_applications")
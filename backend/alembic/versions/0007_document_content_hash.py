@@ -0,0 +1,30 @@
+"""Content hash for deduplicated document storage
+
+Revision ID: 0007_document_content_hash
+Revises: 0006_daily_rollups
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+revision = "0007_document_content_hash"
+down_revision = "0006_daily_rollups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+    
+    # Reference counts and verification reuse look documents up by hash
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_documents_content_hash_document_type "
+            "ON documents (content_hash, document_type)"
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_documents_content_hash_document_type")
+    
+    op.drop_column("documents", "content_hash")
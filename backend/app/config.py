@@ -1,6 +1,6 @@
 """Application configuration."""
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Tuple
 import os
 import sys
 from pathlib import Path
@@ -42,16 +42,58 @@ class Settings(BaseSettings):
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    AUTH_CACHE_TTL: int = 60  # seconds a verified token/user lookup is reused
     
     # File Storage
     UPLOAD_DIR: str = "./uploads"
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
+    CONTENT_LOCK_TIMEOUT: float = 10.0  # seconds to wait for a content object's lock
+    
+    # Logging
+    LOG_QUEUE_SIZE: int = 10000  # lines buffered before new ones are dropped
+    LOG_SAMPLE_RATES: str = "sentiment_analyzed:0.1,llm_completion:0.1"  # event:keep_fraction
+    
+    # Audit Logging
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL: float = 1.0  # seconds
+    AUDIT_MAX_BUFFER: int = 10000  # events held in memory before spilling to disk
+    AUDIT_SPILL_DIR: str = "./audit_spill"
+    AUDIT_RETENTION_DAYS: int = 2555  # ~7 years; 0 keeps audit logs forever
+    
+    # Analytics Rollups
+    ROLLUP_ENABLED: bool = True
+    ROLLUP_INTERVAL: int = 300  # seconds between rollup runs
+    ROLLUP_RESTATE_DAYS: int = 7  # closed days re-aggregated on every run
+    DASHBOARD_CACHE_TTL: int = 30  # seconds a cached dashboard is served without refreshing
+    DASHBOARD_CACHE_STALE: int = 300  # extra seconds a stale dashboard is served while refreshing
+    
+    # Chat History
+    HISTORY_LONG_POLL_MAX: int = 30  # seconds a history long-poll may wait for new messages
+    
+    # Exports
+    EXPORT_BATCH_SIZE: int = 1000  # rows fetched and encoded per batch
+    EXPORT_ROW_GROUP_SIZE: int = 65536  # rows per Parquet row group / Arrow batch
+    
+    # Response Compression
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes; smaller bodies are sent as is
+    COMPRESSION_EXCLUDE_PATHS: str = "/api/analytics/export"  # comma-separated path prefixes (streaming endpoints)
     
     # CORS
     CORS_ORIGINS: str = "http://localhost:3000,http://localhost:5173"
     
+    # Worker Pools
+    THREAD_POOL_SIZE: int = 8  # bcrypt, Fernet, blocking I/O
+    PROCESS_POOL_SIZE: int = 2  # PDF rendering, OCR
+    WORKER_QUEUE_FACTOR: int = 4  # max in-flight jobs per worker before callers wait
+    
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_ALGORITHM: str = "sliding_window"  # sliding_window or token_bucket (leased per worker)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_LEASE_SIZE: int = 10  # tokens leased from Redis per round-trip
+    RATE_LIMIT_LEASE_TTL: float = 5.0  # seconds a local lease stays valid
+    RATE_LIMIT_ROUTES: str = "/api/chat/message:30/60,/api/documents/upload:10/60"  # prefix:calls/seconds
     
     # External Services
     CIBIL_API_KEY: str = "mock_cibil_key"
@@ -71,6 +113,33 @@ class Settings(BaseSettings):
         """Get CORS origins as list."""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
     
+    @property
+    def log_sample_rates(self) -> Dict[str, float]:
+        """Get per-event log sampling rates as {event: keep_fraction}."""
+        rates = {}
+        for entry in self.LOG_SAMPLE_RATES.split(","):
+            if entry.strip():
+                event, rate = entry.strip().rsplit(":", 1)
+                rates[event] = float(rate)
+        return rates
+    
+    @property
+    def compression_exclude_paths(self) -> List[str]:
+        """Get path prefixes that are never compressed."""
+        return [path.strip() for path in self.COMPRESSION_EXCLUDE_PATHS.split(",") if path.strip()]
+    
+    @property
+    def rate_limit_routes(self) -> Dict[str, Tuple[int, int]]:
+        """Get per-route rate limits as {path_prefix: (calls, period_seconds)}."""
+        routes = {}
+        for entry in self.RATE_LIMIT_ROUTES.split(","):
+            if not entry.strip():
+                continue
+            prefix, limit = entry.strip().rsplit(":", 1)
+            calls, period = limit.split("/")
+            routes[prefix] = (int(calls), int(period))
+        return routes
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
@@ -1,17 +1,30 @@
 """Main FastAPI application."""
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import time
 
 from app.config import settings
-from app.utils.logger import setup_logging, get_logger
+from app.utils.logger import setup_logging, shutdown_logging, get_log_stats, get_logger
 from app.utils.database import init_db, close_mongo_connection
+from app.utils.executors import worker_pools
+from app.utils.responses import ORJSONResponse
+from app.utils.audit_log import audit_logger
+from app.services.rollup_service import rollup_service
+from app.services.history_service import history_service
+from app.middleware.rate_limiter import create_rate_limiter
+from app.middleware.auth import principal_cache
+from app.middleware.compression import CompressionMiddleware
 from app.routes import chat, documents, admin, websocket, analytics
 
 # Setup logging
-setup_logging(settings.DEBUG)
+setup_logging(
+    settings.DEBUG,
+    sample_rates=settings.log_sample_rates,
+    queue_size=settings.LOG_QUEUE_SIZE
+)
 logger = get_logger(__name__)
 
 
@@ -21,10 +34,31 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("application_starting", environment=settings.ENVIRONMENT)
     init_db()
+    worker_pools.start()
+    app.state.worker_pools = worker_pools
+    try:
+        audit_logger.ensure_indexes()
+    except Exception as e:
+        logger.error("audit_index_error", error=str(e))
+    audit_logger.writer.start()
+    try:
+        history_service.ensure_indexes()
+    except Exception as e:
+        logger.error("history_index_error", error=str(e))
+    if settings.ROLLUP_ENABLED:
+        rollup_service.start()
+    history_service.start()
+    principal_cache.start()
     yield
     # Shutdown
     logger.info("application_stopping")
+    principal_cache.stop()
+    history_service.stop()
+    await rollup_service.stop()
+    await audit_logger.writer.stop()
+    worker_pools.shutdown()
     close_mongo_connection()
+    shutdown_logging()
 
 
 # Create FastAPI app
@@ -32,9 +66,14 @@ app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
     debug=settings.DEBUG,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
+# Rate limiting middleware (registered before CORS so 429s still carry CORS headers)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(BaseHTTPMiddleware, dispatch=create_rate_limiter())
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -44,6 +83,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression (streaming exports opt out by path prefix)
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        exclude_paths=settings.compression_exclude_paths
+    )
+
 
 # Request timing middleware
 @app.middleware("http")
@@ -83,7 +130,8 @@ async def health_check():
         "status": "healthy",
         "app_name": settings.APP_NAME,
         "version": settings.APP_VERSION,
-        "environment": settings.ENVIRONMENT
+        "environment": settings.ENVIRONMENT,
+        "logging": get_log_stats()
     }
 
 
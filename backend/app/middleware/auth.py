@@ -2,21 +2,173 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
+import asyncio
+import hashlib
+import threading
+import time
+from app.utils.cache import cache
 from app.utils.security import decode_access_token
 from app.utils.database import get_db
-from app.models.user import User
+from app.models.user import User, UserRole
+from app.config import settings
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 security = HTTPBearer()
 
+# Redis channel carrying user ids whose cached principals must be dropped
+AUTH_INVALIDATE_CHANNEL = "auth:invalidate"
+
+
+class Principal:
+    """Verified identity of an authenticated request."""
+    
+    __slots__ = ("id", "role", "is_active")
+    
+    def __init__(self, id: str, role: UserRole, is_active: bool):
+        self.id = id
+        self.role = role
+        self.is_active = is_active
+
+
+class PrincipalCache:
+    """
+    Short-lived cache of verified principals keyed by token hash.
+    
+    Entries live for AUTH_CACHE_TTL seconds (never past the token's own
+    expiry). `invalidate_user` drops a user's entries here and publishes
+    the user id on AUTH_INVALIDATE_CHANNEL; a listener thread started from
+    the lifespan drops them on every other worker too. If a notification
+    is missed (Redis down), the TTL still bounds how long it goes unseen.
+    """
+    
+    def __init__(self, ttl: int = None, max_entries: int = 10000, channel: str = AUTH_INVALIDATE_CHANNEL):
+        """Initialize principal cache."""
+        self.ttl = ttl if ttl is not None else settings.AUTH_CACHE_TTL
+        self.max_entries = max_entries
+        self.channel = channel
+        self._entries: Dict[str, Tuple[Principal, float]] = {}
+        self._tokens_by_user: Dict[str, Set[str]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+    
+    @staticmethod
+    def token_key(token: str) -> str:
+        """Hash a token so raw credentials are never held in memory."""
+        return hashlib.sha256(token.encode()).hexdigest()
+    
+    def get(self, token_key: str) -> Optional[Principal]:
+        """Get a cached principal if still fresh."""
+        entry = self._entries.get(token_key)
+        if entry is None:
+            return None
+        
+        principal, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._discard(token_key, principal.id)
+            return None
+        return principal
+    
+    def set(self, token_key: str, principal: Principal, token_exp: Optional[float] = None) -> None:
+        """Cache a principal, capped at the token's expiry (unix time)."""
+        if self.ttl <= 0:
+            return
+        
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+            if ttl <= 0:
+                return
+        
+        if len(self._entries) >= self.max_entries:
+            self._evict_expired()
+        
+        self._entries[token_key] = (principal, time.monotonic() + ttl)
+        self._tokens_by_user.setdefault(principal.id, set()).add(token_key)
+    
+    def invalidate_user(self, user_id: str) -> None:
+        """Drop every cached token for a user on all workers (e.g. on deactivation)."""
+        self._drop_user(str(user_id))
+        try:
+            cache.redis_client.publish(self.channel, str(user_id))
+        except Exception as e:
+            logger.error("auth_invalidate_publish_error", user_id=str(user_id), error=str(e))
+    
+    def _drop_user(self, user_id: str) -> None:
+        """Drop a user's cached tokens in this worker (event loop thread only)."""
+        for token_key in self._tokens_by_user.pop(user_id, set()):
+            self._entries.pop(token_key, None)
+        logger.info("auth_cache_invalidated", user_id=user_id)
+    
+    def start(self) -> None:
+        """Start applying other workers' invalidations (called from lifespan)."""
+        if self._listener is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self._listener = threading.Thread(target=self._listen, name="auth-invalidate-listener", daemon=True)
+        self._listener.start()
+    
+    def stop(self) -> None:
+        """Stop the invalidation listener."""
+        if self._listener is None:
+            return
+        self._stopped.set()
+        self._listener.join(timeout=5)
+        self._listener = None
+    
+    def _listen(self) -> None:
+        """Listener thread: subscribe, relay, and resubscribe after Redis errors."""
+        while not self._stopped.is_set():
+            pubsub = cache.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._loop.call_soon_threadsafe(self._drop_user, message["data"])
+            except Exception as e:
+                logger.error("auth_invalidate_listener_error", error=str(e))
+                self._stopped.wait(5)
+            finally:
+                pubsub.close()
+    
+    def clear(self) -> None:
+        """Drop all cached principals."""
+        self._entries.clear()
+        self._tokens_by_user.clear()
+    
+    def _discard(self, token_key: str, user_id: str) -> None:
+        """Remove a single entry."""
+        self._entries.pop(token_key, None)
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(token_key)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+    
+    def _evict_expired(self) -> None:
+        """Evict stale entries once the cache is full."""
+        now = time.monotonic()
+        for token_key, (principal, expires_at) in list(self._entries.items()):
+            if expires_at <= now:
+                self._discard(token_key, principal.id)
+        
+        if len(self._entries) >= self.max_entries:
+            self.clear()
+
+
+# Global principal cache instance
+principal_cache = PrincipalCache()
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> User:
+) -> Principal:
     """Get current authenticated user."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,27 +178,40 @@ async def get_current_user(
     
     try:
         token = credentials.credentials
-        payload = decode_access_token(token)
+        token_key = PrincipalCache.token_key(token)
         
-        if payload is None:
-            raise credentials_exception
-        
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-        
-        user = db.query(User).filter(User.id == user_id).first()
-        if user is None:
-            raise credentials_exception
+        principal = principal_cache.get(token_key)
+        if principal is None:
+            payload = decode_access_token(token)
+            
+            if payload is None:
+                raise credentials_exception
+            
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+            
+            user = db.query(User).filter(User.id == user_id).first()
+            if user is None:
+                raise credentials_exception
+            
+            principal = Principal(
+                id=str(user.id),
+                role=user.role,
+                is_active=bool(user.is_active)
+            )
+            principal_cache.set(token_key, principal, payload.get("exp"))
         
-        if not user.is_active:
+        if not principal.is_active:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="User account is inactive"
             )
         
-        return user
-        
+        return principal
+    
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("auth_error", error=str(e))
         raise credentials_exception
@@ -55,7 +220,7 @@ async def get_current_user(
 async def get_optional_user(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security),
     db: Session = Depends(get_db)
-) -> Optional[User]:
+) -> Optional[Principal]:
     """Get current user if authenticated, None otherwise."""
     if not credentials:
         return None
@@ -64,5 +229,3 @@ async def get_optional_user(
         return await get_current_user(credentials, db)
     except HTTPException:
         return None
-
-
@@ -0,0 +1,176 @@
+"""Negotiated gzip/Brotli response compression middleware."""
+from typing import Iterable, List, Optional, Tuple
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import brotli
+import zlib
+
+
+# Content types that are already compressed and not worth re-encoding
+PRECOMPRESSED_TYPES = (
+    "application/gzip",
+    "application/zip",
+    "application/pdf",
+    "application/vnd.apache.parquet",
+    "application/vnd.apache.arrow",
+    "image/",
+    "audio/",
+    "video/",
+)
+
+
+def parse_accept_encoding(header: str) -> List[Tuple[str, float]]:
+    """Parse Accept-Encoding into (coding, q) pairs, dropping q=0 entries."""
+    codings = []
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding and quality > 0:
+            codings.append((coding.strip().lower(), quality))
+    return codings
+
+
+class _Compressor:
+    """Incremental gzip or Brotli encoder with a common interface."""
+    
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+    
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """Encode a chunk; non-final chunks are flushed so streams keep moving."""
+        if self.encoding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._zlib.compress(data)
+        return out + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """
+    Compress HTTP responses with the best encoding the client accepts.
+    
+    Brotli is preferred, then gzip. Bodies smaller than `minimum_size`, responses that already
+    carry a Content-Encoding or an already-compressed content type, and
+    paths under `exclude_paths` (e.g. streaming exports) pass through
+    untouched. Streamed bodies are compressed chunk by chunk.
+    """
+    
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        exclude_paths: Iterable[str] = (),
+        gzip_level: int = 6,
+        brotli_quality: int = 4
+    ):
+        """Initialize compression middleware."""
+        self.app = app
+        self.minimum_size = minimum_size
+        self.exclude_paths = tuple(exclude_paths)
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ("br", "gzip")
+    
+    def negotiate(self, accept_encoding: str) -> Optional[str]:
+        """Pick the supported encoding with the highest q (server order breaks ties)."""
+        accepted = dict(parse_accept_encoding(accept_encoding))
+        wildcard = accepted.get("*", 0.0)
+        best, best_quality = None, 0.0
+        for encoding in self.encodings:
+            quality = accepted.get(encoding, wildcard)
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_paths):
+            await self.app(scope, receive, send)
+            return
+        
+        encoding = self.negotiate(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Per-request send wrapper that decides on the first body chunk."""
+    
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        self._start: Optional[Message] = None
+        self._compressor: Optional[_Compressor] = None
+        self._passthrough = False
+    
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk shows what to do
+            self._start = message
+            return
+        
+        if message["type"] != "http.response.body" or self._passthrough:
+            await self._send(message)
+            return
+        
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        
+        if self._compressor is None:
+            if not self._should_compress(body, more_body):
+                self._passthrough = True
+                await self._send(self._start)
+                await self._send(message)
+                return
+            
+            self._compressor = _Compressor(
+                self.encoding,
+                self.middleware.gzip_level,
+                self.middleware.brotli_quality
+            )
+            headers = MutableHeaders(raw=self._start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            # The encoded bytes differ from the identity ones
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = f"W/{etag}"
+            
+            body = self._compressor.compress(body, final=not more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            
+            await self._send(self._start)
+            await self._send({"type": "http.response.body", "body": body, "more_body": more_body})
+            return
+        
+        await self._send({
+            "type": "http.response.body",
+            "body": self._compressor.compress(body, final=not more_body),
+            "more_body": more_body
+        })
+    
+    def _should_compress(self, body: bytes, more_body: bool) -> bool:
+        """Whether this response is worth compressing."""
+        headers = Headers(raw=self._start["headers"])
+        if "content-encoding" in headers:
+            return False
+        if headers.get("content-type", "").startswith(PRECOMPRESSED_TYPES):
+            return False
+        return more_body or len(body) >= self.middleware.minimum_size
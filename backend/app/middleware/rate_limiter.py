@@ -1,79 +1,354 @@
 """Rate limiting middleware."""
 from fastapi import Request, HTTPException, status
-from typing import Callable
+from fastapi.responses import JSONResponse
+from typing import Callable, Dict, Optional, Tuple
 import time
+import uuid
 from app.utils.cache import cache
+from app.utils.security import decode_access_token
 from app.config import settings
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
 
+SLIDING_WINDOW = "sliding_window"
+TOKEN_BUCKET = "token_bucket"
+
+
+# Sliding window log: one sorted-set member per admitted request, scored by
+# Redis server time in milliseconds. Trim, count and admit happen atomically.
+# Returns {allowed, remaining, retry_after_ms}.
+SLIDING_WINDOW_SCRIPT = """
+local key = KEYS[1]
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local member = ARGV[3]
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+local count = redis.call('ZCARD', key)
+if count < limit then
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, window)
+    return {1, limit - count - 1, 0}
+end
+local retry = window
+local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+if oldest[2] then
+    retry = tonumber(oldest[2]) + window - now
+end
+return {0, 0, retry}
+"""
+
+# Token bucket: refills continuously at limit/window tokens per millisecond up
+# to `capacity`. Returns {allowed, remaining, retry_after_ms}.
+TOKEN_BUCKET_SCRIPT = """
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= requested then
+    tokens = tokens - requested
+    allowed = 1
+else
+    retry = math.ceil((requested - tokens) / rate)
+end
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', key, math.ceil(capacity / rate) + 1000)
+return {allowed, math.floor(tokens), retry}
+"""
+
+# Token lease: same bucket as TOKEN_BUCKET_SCRIPT, but grants up to
+# `requested` tokens at once so a worker can spend them locally.
+# Returns {granted, remaining, retry_after_ms}.
+TOKEN_LEASE_SCRIPT = """
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local state = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local granted = math.min(math.floor(tokens), requested)
+local retry = 0
+if granted < 1 then
+    granted = 0
+    retry = math.ceil((1 - tokens) / rate)
+end
+tokens = tokens - granted
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', key, math.ceil(capacity / rate) + 1000)
+return {granted, math.floor(tokens), retry}
+"""
+
+
 class RateLimiter:
-    """Rate limiter using Redis."""
-    
-    def __init__(self, calls: int = None, period: int = 60):
+    """Atomic Redis rate limiter (one script call per request)."""
+
+    def __init__(
+        self,
+        calls: int = None,
+        period: int = 60,
+        algorithm: str = None,
+        route_limits: Optional[Dict[str, Tuple[int, int]]] = None,
+        exempt_paths: Tuple[str, ...] = ("/health",)
+    ):
         """
         Initialize rate limiter.
-        
+
         Args:
             calls: Number of calls allowed per period
             period: Time period in seconds
+            algorithm: "sliding_window" or "token_bucket"
+            route_limits: Path prefix -> (calls, period) overrides
+            exempt_paths: Paths that are never rate limited
         """
         self.calls = calls or settings.RATE_LIMIT_PER_MINUTE
         self.period = period
-    
+        self.algorithm = algorithm or settings.RATE_LIMIT_ALGORITHM
+        if self.algorithm not in (SLIDING_WINDOW, TOKEN_BUCKET):
+            raise ValueError(f"Unknown rate limit algorithm: {self.algorithm}")
+
+        # Longest prefix wins
+        self.route_limits = sorted(
+            (settings.rate_limit_routes if route_limits is None else route_limits).items(),
+            key=lambda item: len(item[0]),
+            reverse=True
+        )
+        self.exempt_paths = set(exempt_paths)
+
+        self._sliding_window = cache.redis_client.register_script(SLIDING_WINDOW_SCRIPT)
+        self._token_bucket = cache.redis_client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def get_client_id(self, request: Request) -> str:
+        """Identify the caller by token subject, falling back to IP."""
+        auth_header = request.headers.get("authorization")
+        if auth_header and auth_header.lower().startswith("bearer "):
+            payload = decode_access_token(auth_header[7:])
+            if payload and payload.get("sub"):
+                return f"user:{payload['sub']}"
+
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    def get_route_limit(self, path: str) -> Tuple[str, int, int]:
+        """Get (scope, calls, period) for a request path."""
+        for prefix, (calls, period) in self.route_limits:
+            if path.startswith(prefix):
+                return prefix, calls, period
+        return "*", self.calls, self.period
+
+    def hit(self, key: str, calls: int, period: int) -> Tuple[bool, int, int]:
+        """
+        Consume one request from the limit at `key`.
+
+        Returns:
+            (allowed, remaining, retry_after_ms). Fails open if Redis is down.
+        """
+        window_ms = period * 1000
+        try:
+            if self.algorithm == TOKEN_BUCKET:
+                result = self._token_bucket(
+                    keys=[key],
+                    args=[calls, calls / window_ms, 1]
+                )
+            else:
+                result = self._sliding_window(
+                    keys=[key],
+                    args=[window_ms, calls, uuid.uuid4().hex]
+                )
+            return bool(int(result[0])), int(result[1]), int(result[2])
+        except Exception as e:
+            logger.error("rate_limit_error", key=key, error=str(e))
+            return True, calls, 0
+
+    def check(self, request: Request) -> Tuple[bool, int, int, int]:
+        """Check a request against its route limit.
+
+        Returns:
+            (allowed, limit, remaining, retry_after_ms)
+        """
+        client_id = self.get_client_id(request)
+        scope, calls, period = self.get_route_limit(request.url.path)
+        rate_key = f"rate_limit:{self.algorithm}:{scope}:{client_id}"
+
+        allowed, remaining, retry_after_ms = self.hit(rate_key, calls, period)
+        if not allowed:
+            logger.warning("rate_limit_exceeded", client_id=client_id, scope=scope)
+        return allowed, calls, remaining, retry_after_ms
+
     async def __call__(self, request: Request, call_next: Callable):
         """Rate limit middleware."""
-        # Get client identifier (IP or user ID)
-        client_id = request.client.host
-        
-        # Check if user is authenticated
-        auth_header = request.headers.get("authorization")
-        if auth_header:
-            # Use user-specific rate limit if authenticated
-            client_id = f"user:{auth_header[-10:]}"
-        
-        # Rate limit key
-        rate_key = f"rate_limit:{client_id}"
-        
-        # Get current count
-        current = cache.get(rate_key)
-        
-        if current is None:
-            # First request in this period
-            cache.set(rate_key, 1, self.period)
-        elif current >= self.calls:
-            # Rate limit exceeded
-            logger.warning("rate_limit_exceeded", client_id=client_id)
-            raise HTTPException(
+        if request.url.path in self.exempt_paths:
+            return await call_next(request)
+
+        allowed, limit, remaining, retry_after_ms = self.check(request)
+
+        if not allowed:
+            return JSONResponse(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Rate limit exceeded. Please try again later."
+                content={"detail": "Rate limit exceeded. Please try again later."},
+                headers={
+                    "Retry-After": str(max(1, -(-retry_after_ms // 1000))),
+                    "X-RateLimit-Limit": str(limit),
+                    "X-RateLimit-Remaining": "0"
+                }
             )
-        else:
-            # Increment count
-            cache.redis_client.incr(rate_key)
-        
+
         response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(limit)
+        response.headers["X-RateLimit-Remaining"] = str(remaining)
         return response
 
 
+class HybridRateLimiter(RateLimiter):
+    """
+    Token-bucket limiter that leases batches of tokens from Redis.
+
+    Each worker spends leased tokens from an in-memory bucket and only runs
+    the Redis script when its lease is used up or expired, so most requests
+    are decided without a network round-trip. Tokens only ever come from the
+    shared Redis bucket, so the global limit still holds across workers;
+    unspent leases simply lapse.
+    """
+
+    def __init__(
+        self,
+        calls: int = None,
+        period: int = 60,
+        route_limits: Optional[Dict[str, Tuple[int, int]]] = None,
+        lease_size: int = None,
+        lease_ttl: float = None,
+        max_local_keys: int = 10000,
+        exempt_paths: Tuple[str, ...] = ("/health",)
+    ):
+        """
+        Initialize hybrid rate limiter.
+
+        Args:
+            calls: Number of calls allowed per period
+            period: Time period in seconds
+            route_limits: Path prefix -> (calls, period) overrides
+            lease_size: Maximum tokens leased from Redis at once
+            lease_ttl: Seconds a lease stays valid in this worker
+            max_local_keys: Upper bound on locally tracked buckets
+            exempt_paths: Paths that are never rate limited
+        """
+        super().__init__(
+            calls=calls,
+            period=period,
+            algorithm=TOKEN_BUCKET,
+            route_limits=route_limits,
+            exempt_paths=exempt_paths
+        )
+        self.lease_size = lease_size or settings.RATE_LIMIT_LEASE_SIZE
+        self.lease_ttl = lease_ttl or settings.RATE_LIMIT_LEASE_TTL
+        self.max_local_keys = max_local_keys
+
+        # key -> [tokens, lease_expires_at, blocked_until]
+        self._local: Dict[str, list] = {}
+        self._token_lease = cache.redis_client.register_script(TOKEN_LEASE_SCRIPT)
+
+    def _lease_batch(self, calls: int) -> int:
+        """Lease size for a limit; one worker never holds more than a quarter of it."""
+        return max(1, min(self.lease_size, calls // 4))
+
+    def _evict_expired(self, now: float) -> None:
+        """Drop lapsed local buckets once the table is full."""
+        expired = [
+            key for key, (_, expires_at, blocked_until) in self._local.items()
+            if expires_at <= now and blocked_until <= now
+        ]
+        for key in expired:
+            del self._local[key]
+
+        if len(self._local) >= self.max_local_keys:
+            self._local.clear()
+
+    def hit(self, key: str, calls: int, period: int) -> Tuple[bool, int, int]:
+        """
+        Consume one request, leasing from Redis only when the local lease is spent.
+
+        Returns:
+            (allowed, remaining, retry_after_ms). Fails open if Redis is down.
+        """
+        now = time.monotonic()
+        bucket = self._local.get(key)
+
+        if bucket is not None:
+            tokens, expires_at, blocked_until = bucket
+            if tokens > 0 and expires_at > now:
+                bucket[0] = tokens - 1
+                return True, tokens - 1, 0
+            if blocked_until > now:
+                return False, 0, int((blocked_until - now) * 1000)
+
+        window_ms = period * 1000
+        try:
+            granted, remaining, retry_after_ms = (
+                int(value) for value in self._token_lease(
+                    keys=[key],
+                    args=[calls, calls / window_ms, self._lease_batch(calls)]
+                )
+            )
+        except Exception as e:
+            logger.error("rate_limit_error", key=key, error=str(e))
+            return True, calls, 0
+
+        if len(self._local) >= self.max_local_keys:
+            self._evict_expired(now)
+
+        if granted < 1:
+            self._local[key] = [0, 0.0, now + retry_after_ms / 1000]
+            return False, 0, retry_after_ms
+
+        self._local[key] = [granted - 1, now + self.lease_ttl, 0.0]
+        return True, remaining + granted - 1, 0
+
+
+def create_rate_limiter(algorithm: str = None) -> RateLimiter:
+    """Build the middleware limiter for RATE_LIMIT_ALGORITHM.
+
+    Token buckets use HybridRateLimiter's per-worker leases; the sliding
+    window needs every request counted in Redis, so it uses RateLimiter.
+    """
+    algorithm = algorithm or settings.RATE_LIMIT_ALGORITHM
+    if algorithm == TOKEN_BUCKET:
+        return HybridRateLimiter()
+    return RateLimiter(algorithm=algorithm)
+
+
 async def check_rate_limit(request: Request, calls: int = None):
     """Check rate limit for a specific endpoint."""
     calls = calls or settings.RATE_LIMIT_PER_MINUTE
-    client_id = request.client.host
-    
-    rate_key = f"rate_limit:{client_id}:{request.url.path}"
-    current = cache.get(rate_key)
-    
-    if current is None:
-        cache.set(rate_key, 1, 60)
-    elif current >= calls:
+    limiter = RateLimiter(calls=calls, period=60, route_limits={})
+
+    client_id = limiter.get_client_id(request)
+    rate_key = f"rate_limit:{limiter.algorithm}:{request.url.path}:{client_id}"
+
+    allowed, _, retry_after_ms = limiter.hit(rate_key, calls, 60)
+    if not allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit exceeded"
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, -(-retry_after_ms // 1000)))}
         )
-    else:
-        cache.redis_client.incr(rate_key)
-
-
@@ -1,3 +1,5 @@
 """Database models package."""
+# Import every model so string targets in relationship() always resolve
+from app.models import user, conversation, loan_application, customer_profile, metrics  # noqa: F401
 
 
@@ -1,5 +1,5 @@
 """Conversation data models."""
-from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Enum, Integer
+from sqlalchemy import Column, String, DateTime, ForeignKey, Text, Enum, Integer, Index, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -54,6 +54,24 @@ class Conversation(Base):
     # Sentiment tracking
     overall_sentiment = Column(String, nullable=True)
     sentiment_score = Column(String, nullable=True)
+    
+    # Relationships
+    user = relationship("User", back_populates="conversations")
+    messages = relationship(
+        "Message",
+        back_populates="conversation",
+        order_by="Message.created_at"
+    )
+    application = relationship("LoanApplication", back_populates="conversation", uselist=False)
+    
+    # Indexes (created on existing databases by alembic revisions 0001, 0004 and 0005)
+    __table_args__ = (
+        Index("ix_conversations_user_id_started_at_id", user_id, started_at.desc(), id.desc()),
+        Index("ix_conversations_started_at_id", started_at.desc(), id.desc()),
+        Index("ix_conversations_status_started_at_id", status, started_at.desc(), id.desc()),
+        Index("ix_conversations_active", started_at, postgresql_where=text("status = 'ACTIVE'")),
+        Index("ix_conversations_stage_started_at", conversation_state["stage"].astext, started_at),
+    )
 
 
 class Message(Base):
@@ -75,4 +93,10 @@ class Message(Base):
     # Voice support
     audio_url = Column(String, nullable=True)
     is_voice_message = Column(String, default=False)
+    
+    conversation = relationship("Conversation", back_populates="messages")
+    
+    __table_args__ = (
+        Index("ix_messages_conversation_id_created_at", conversation_id, created_at),
+    )
 
@@ -1,5 +1,5 @@
 """Customer profile model for personalization."""
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Text, Integer
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from datetime import datetime
 import uuid
@@ -14,9 +14,9 @@ class CustomerProfile(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), unique=True, nullable=False)
     
     # Behavioral data
-    total_conversations = Column(String, default=0)
-    total_applications = Column(String, default=0)
-    successful_applications = Column(String, default=0)
+    total_conversations = Column(Integer, default=0, server_default="0", nullable=False)
+    total_applications = Column(Integer, default=0, server_default="0", nullable=False)
+    successful_applications = Column(Integer, default=0, server_default="0", nullable=False)
     
     # Preferences
     preferred_loan_amount_range = Column(String, nullable=True)
@@ -26,7 +26,9 @@ class CustomerProfile(Base):
     
     # Sentiment history
     average_sentiment_score = Column(Numeric(5, 2), nullable=True)
-    sentiment_history = Column(JSONB, default=[])
+    sentiment_count = Column(Integer, default=0, server_default="0", nullable=False)
+    sentiment_sum = Column(Numeric(14, 6), default=0, server_default="0", nullable=False)
+    sentiment_history = Column(JSONB, default=[])  # ring buffer; slot = sentiment_count % size
     
     # Engagement metrics
     last_engagement_at = Column(DateTime, nullable=True)
@@ -48,7 +50,7 @@ class CustomerProfile(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Additional metadata
-    metadata = Column(JSONB, default={})
+    profile_metadata = Column("metadata", JSONB, default={})  # "metadata" is reserved on declarative models
     notes = Column(Text, nullable=True)
 
 
@@ -1,6 +1,7 @@
 """Loan application data models."""
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Boolean, Enum, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Boolean, Enum, Text, Index, Integer, BigInteger, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 import enum
@@ -48,13 +49,13 @@ class LoanApplication(Base):
     loan_purpose = Column(Enum(LoanPurpose), nullable=True)
     requested_amount = Column(Numeric(12, 2), nullable=True)
     approved_amount = Column(Numeric(12, 2), nullable=True)
-    tenure_months = Column(String, nullable=True)
+    tenure_months = Column(Integer, nullable=True)
     interest_rate = Column(Numeric(5, 2), nullable=True)
     
     # Applicant Financial Details
     monthly_income = Column(Numeric(12, 2), nullable=True)
     existing_emis = Column(Numeric(12, 2), nullable=True)
-    credit_score = Column(String, nullable=True)
+    credit_score = Column(Integer, nullable=True)
     
     # Risk Assessment
     risk_score = Column(Numeric(5, 2), nullable=True)
@@ -79,6 +80,33 @@ class LoanApplication(Base):
     # Additional metadata
     app_metadata = Column(JSONB, default={})
     notes = Column(Text, nullable=True)
+    
+    # Relationships
+    user = relationship("User", back_populates="applications")
+    conversation = relationship("Conversation", back_populates="application")
+    documents = relationship(
+        "Document",
+        back_populates="application",
+        order_by="Document.uploaded_at"
+    )
+    
+    # Indexes (created on existing databases by alembic revisions 0001, 0004 and 0005)
+    __table_args__ = (
+        Index("ix_loan_applications_conversation_id", conversation_id),
+        Index("ix_loan_applications_created_at_id", created_at.desc(), id.desc()),
+        Index("ix_loan_applications_status_created_at_id", status, created_at.desc(), id.desc()),
+        Index(
+            "ix_loan_applications_sanctioned",
+            created_at,
+            postgresql_where=text("sanctioned_at IS NOT NULL")
+        ),
+        # Covers the conversion funnel so it can run as an index-only scan
+        Index(
+            "ix_loan_applications_funnel",
+            created_at,
+            postgresql_include=["status", "submitted_at"]
+        ),
+    )
 
 
 class Document(Base):
@@ -93,8 +121,9 @@ class Document(Base):
     document_type = Column(String, nullable=False)  # pan, aadhaar, bank_statement, etc.
     file_name = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
-    file_size = Column(String, nullable=False)
+    file_size = Column(BigInteger, nullable=False)  # bytes
     mime_type = Column(String, nullable=False)
+    content_hash = Column(String(64), nullable=True)  # SHA-256 key in the content store
     
     # Verification status
     is_verified = Column(Boolean, default=False)
@@ -111,5 +140,14 @@ class Document(Base):
     # Fraud detection
     fraud_flags = Column(JSONB, default=[])
     is_suspicious = Column(Boolean, default=False)
+    
+    application = relationship("LoanApplication", back_populates="documents")
+    
+    # Indexes (created on existing databases by alembic revisions 0001 and 0007)
+    __table_args__ = (
+        Index("ix_documents_application_id_uploaded_at", application_id, uploaded_at),
+        # Content store reference counts and verification reuse
+        Index("ix_documents_content_hash_document_type", content_hash, document_type),
+    )
 
 
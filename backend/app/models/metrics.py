@@ -1,5 +1,5 @@
 """Metrics and analytics models."""
-from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Boolean
+from sqlalchemy import Column, String, DateTime, ForeignKey, Numeric, Boolean, Integer, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from datetime import datetime
 import uuid
@@ -7,19 +7,20 @@ from app.utils.database import Base
 
 
 class ConversionMetric(Base):
-    """Conversion metrics model."""
+    """Conversion metrics model (one row per UTC day, see RollupService)."""
     __tablename__ = "conversion_metrics"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    date = Column(DateTime, default=datetime.utcnow, index=True)
+    date = Column(DateTime, default=datetime.utcnow)
     
     # Funnel metrics
-    total_conversations = Column(String, default=0)
-    qualified_leads = Column(String, default=0)
-    documents_submitted = Column(String, default=0)
-    applications_submitted = Column(String, default=0)
-    applications_approved = Column(String, default=0)
-    sanctioned = Column(String, default=0)
+    total_conversations = Column(Integer, default=0, server_default="0", nullable=False)
+    qualified_leads = Column(Integer, default=0, server_default="0", nullable=False)
+    total_applications = Column(Integer, default=0, server_default="0", nullable=False)
+    documents_submitted = Column(Integer, default=0, server_default="0", nullable=False)
+    applications_submitted = Column(Integer, default=0, server_default="0", nullable=False)
+    applications_approved = Column(Integer, default=0, server_default="0", nullable=False)
+    sanctioned = Column(Integer, default=0, server_default="0", nullable=False)
     
     # Conversion rates
     qualification_rate = Column(Numeric(5, 2), default=0)
@@ -34,20 +35,26 @@ class ConversionMetric(Base):
     
     # Agent performance
     agent_performance = Column(JSONB, default={})
+    
+    # Rollups are upserted on their day; the unique key also serves date
+    # lookups (alembic revision 0006)
+    __table_args__ = (
+        Index("ux_conversion_metrics_date", date, unique=True),
+    )
 
 
 class AgentPerformance(Base):
-    """Agent performance metrics."""
+    """Agent performance metrics (one row per agent per UTC day)."""
     __tablename__ = "agent_performance"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    agent_type = Column(String, nullable=False, index=True)
+    agent_type = Column(String, nullable=False)
     date = Column(DateTime, default=datetime.utcnow, index=True)
     
     # Performance metrics
-    total_interactions = Column(String, default=0)
-    successful_handoffs = Column(String, default=0)
-    failed_handoffs = Column(String, default=0)
+    total_interactions = Column(Integer, default=0, server_default="0", nullable=False)
+    successful_handoffs = Column(Integer, default=0, server_default="0", nullable=False)
+    failed_handoffs = Column(Integer, default=0, server_default="0", nullable=False)
     avg_response_time = Column(Numeric(10, 2), nullable=True)
     
     # Quality metrics
@@ -56,6 +63,11 @@ class AgentPerformance(Base):
     
     # Specific metrics
     metrics_data = Column(JSONB, default={})
+    
+    # agent_type lookups use the leading column of the unique key
+    __table_args__ = (
+        Index("ux_agent_performance_agent_type_date", agent_type, date, unique=True),
+    )
 
 
 class ABTest(Base):
@@ -72,10 +84,10 @@ class ABTest(Base):
     variant_b_config = Column(JSONB, default={})
     
     # Results
-    variant_a_conversions = Column(String, default=0)
-    variant_a_total = Column(String, default=0)
-    variant_b_conversions = Column(String, default=0)
-    variant_b_total = Column(String, default=0)
+    variant_a_conversions = Column(Integer, default=0, server_default="0", nullable=False)
+    variant_a_total = Column(Integer, default=0, server_default="0", nullable=False)
+    variant_b_conversions = Column(Integer, default=0, server_default="0", nullable=False)
+    variant_b_total = Column(Integer, default=0, server_default="0", nullable=False)
     
     # Statistical significance
     p_value = Column(Numeric(5, 4), nullable=True)
@@ -1,6 +1,7 @@
 """User data models."""
-from sqlalchemy import Column, String, DateTime, Boolean, Enum
+from sqlalchemy import Column, String, DateTime, Boolean, Enum, Index
 from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
 from datetime import datetime
 import uuid
 import enum
@@ -49,5 +50,14 @@ class User(Base):
     
     # Preferences
     preferred_language = Column(String, default="english")
+    
+    # Relationships
+    conversations = relationship("Conversation", back_populates="user")
+    applications = relationship("LoanApplication", back_populates="user")
+    
+    # Keyset pagination for admin user lists (alembic revision 0004)
+    __table_args__ = (
+        Index("ix_users_created_at_id", created_at.desc(), id.desc()),
+    )
 
 
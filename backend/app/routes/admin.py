@@ -1,15 +1,22 @@
 """Admin endpoints for application and user management."""
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+import uuid
 
 from app.utils.database import get_db
+from app.utils.executors import run_in_thread
 from app.utils.logger import get_logger
+from app.utils.pagination import keyset_page
+from app.utils.responses import ORJSONResponse, conditional_response, make_etag
 from app.models.user import User
 from app.models.loan_application import LoanApplication, ApplicationStatus
 from app.models.conversation import Conversation
+from app.services.document_service import document_service
+from app.middleware.auth import principal_cache
+from app.utils.audit_log import audit_logger
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -26,6 +33,11 @@ class ApplicationListItem(BaseModel):
     updated_at: datetime
 
 
+class ApplicationListPage(BaseModel):
+    applications: List[ApplicationListItem]
+    next_cursor: Optional[str]
+
+
 class ApplicationDetail(BaseModel):
     id: str
     application_number: str
@@ -43,104 +55,167 @@ class ApplicationDetail(BaseModel):
     documents: List[dict]
 
 
-@router.get("/applications", response_model=List[ApplicationListItem])
+class ApplicationBatchRequest(BaseModel):
+    application_ids: List[str] = Field(..., max_length=100)
+
+
+@router.get("/applications", response_model=ApplicationListPage)
 async def list_applications(
     status: Optional[str] = None,
     limit: int = Query(50, le=100),
-    offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """List all loan applications with filtering."""
+    """List loan applications, newest first; pass `next_cursor` back as `cursor` for the next page."""
     try:
         query = db.query(LoanApplication)
         
         if status:
             query = query.filter(LoanApplication.status == status)
         
-        applications = query.order_by(
-            LoanApplication.created_at.desc()
-        ).limit(limit).offset(offset).all()
-        
-        return [
-            ApplicationListItem(
-                id=str(app.id),
-                application_number=app.application_number,
-                user_id=str(app.user_id),
-                status=app.status.value,
-                loan_amount=float(app.requested_amount) if app.requested_amount else None,
-                created_at=app.created_at,
-                updated_at=app.updated_at
-            )
-            for app in applications
-        ]
+        applications, next_cursor = keyset_page(
+            query, LoanApplication.created_at, LoanApplication.id, limit, cursor
+        )
+        
+        return ORJSONResponse({
+            "applications": [
+                {
+                    "id": str(app.id),
+                    "application_number": app.application_number,
+                    "user_id": str(app.user_id),
+                    "status": app.status.value,
+                    "loan_amount": float(app.requested_amount) if app.requested_amount else None,
+                    "created_at": app.created_at,
+                    "updated_at": app.updated_at
+                }
+                for app in applications
+            ],
+            "next_cursor": next_cursor
+        })
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("list_applications_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _application_detail(application: LoanApplication) -> dict:
+    """Build the ApplicationDetail payload from an application with user/documents loaded."""
+    user = application.user
+    
+    user_data = {
+        "id": str(user.id),
+        "full_name": user.full_name,
+        "email": user.email,
+        "phone": user.phone
+    } if user else {}
+    
+    docs_data = [
+        {
+            "id": str(doc.id),
+            "document_type": doc.document_type,
+            "filename": doc.file_name,
+            "is_verified": doc.is_verified,
+            "uploaded_at": doc.uploaded_at.isoformat()
+        }
+        for doc in application.documents
+    ]
+    
+    return {
+        "id": str(application.id),
+        "application_number": application.application_number,
+        "user": user_data,
+        "status": application.status.value,
+        "loan_purpose": application.loan_purpose.value if application.loan_purpose else None,
+        "requested_amount": float(application.requested_amount) if application.requested_amount else None,
+        "approved_amount": float(application.approved_amount) if application.approved_amount else None,
+        "interest_rate": float(application.interest_rate) if application.interest_rate else None,
+        "tenure_months": application.tenure_months,
+        "monthly_income": float(application.monthly_income) if application.monthly_income else None,
+        "credit_score": application.credit_score,
+        "risk_category": application.risk_category,
+        "created_at": application.created_at,
+        "documents": docs_data
+    }
+
+
 @router.get("/applications/{application_id}", response_model=ApplicationDetail)
 async def get_application_detail(
     application_id: str,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    """Get detailed application information."""
+    """Get detailed application information (supports If-None-Match)."""
     try:
-        application = db.query(LoanApplication).filter(
+        # Version columns only; the full detail is loaded on a miss
+        version = db.query(
+            LoanApplication.updated_at,
+            User.updated_at
+        ).outerjoin(
+            User, User.id == LoanApplication.user_id
+        ).filter(
             LoanApplication.id == application_id
         ).first()
         
-        if not application:
+        if not version:
             raise HTTPException(status_code=404, detail="Application not found")
         
-        # Get user details
-        user = db.query(User).filter(User.id == application.user_id).first()
+        etag = make_etag(
+            application_id,
+            *version,
+            *document_service.get_documents_version(db, application_id)
+        )
+        
+        # Application, user and documents in a single joined query
+        return conditional_response(request, etag, lambda: _application_detail(
+            db.query(LoanApplication).options(
+                joinedload(LoanApplication.user),
+                joinedload(LoanApplication.documents)
+            ).filter(
+                LoanApplication.id == application_id
+            ).one()
+        ))
         
-        user_data = {
-            "id": str(user.id),
-            "full_name": user.full_name,
-            "email": user.email,
-            "phone": user.phone
-        } if user else {}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("get_application_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/applications/batch", response_model=List[ApplicationDetail])
+async def get_application_details_batch(
+    request: ApplicationBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """Get details for many applications in a fixed number of queries."""
+    try:
+        try:
+            application_ids = [uuid.UUID(app_id) for app_id in request.application_ids]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid application id")
         
-        # Get documents
-        from app.models.loan_application import Document
-        documents = db.query(Document).filter(
-            Document.application_id == application_id
+        # One query for applications + users, one for all their documents
+        applications = db.query(LoanApplication).options(
+            joinedload(LoanApplication.user),
+            selectinload(LoanApplication.documents)
+        ).filter(
+            LoanApplication.id.in_(application_ids)
         ).all()
         
-        docs_data = [
-            {
-                "id": str(doc.id),
-                "document_type": doc.document_type,
-                "filename": doc.file_name,
-                "is_verified": doc.is_verified,
-                "uploaded_at": doc.uploaded_at.isoformat()
-            }
-            for doc in documents
-        ]
-        
-        return ApplicationDetail(
-            id=str(application.id),
-            application_number=application.application_number,
-            user=user_data,
-            status=application.status.value,
-            loan_purpose=application.loan_purpose.value if application.loan_purpose else None,
-            requested_amount=float(application.requested_amount) if application.requested_amount else None,
-            approved_amount=float(application.approved_amount) if application.approved_amount else None,
-            interest_rate=float(application.interest_rate) if application.interest_rate else None,
-            tenure_months=int(application.tenure_months) if application.tenure_months else None,
-            monthly_income=float(application.monthly_income) if application.monthly_income else None,
-            credit_score=int(application.credit_score) if application.credit_score else None,
-            risk_category=application.risk_category,
-            created_at=application.created_at,
-            documents=docs_data
-        )
+        # Preserve the requested order; unknown ids are skipped
+        by_id = {app.id: app for app in applications}
+        return ORJSONResponse([
+            _application_detail(by_id[app_id])
+            for app_id in dict.fromkeys(application_ids)
+            if app_id in by_id
+        ])
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error("get_application_error", error=str(e))
+        logger.error("get_application_batch_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -148,6 +223,7 @@ async def get_application_detail(
 async def update_application_status(
     application_id: str,
     new_status: str,
+    request: Request,
     notes: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
@@ -166,6 +242,7 @@ async def update_application_status(
         except KeyError:
             raise HTTPException(status_code=400, detail="Invalid status")
         
+        old_status = application.status
         application.status = status_enum
         if notes:
             application.notes = notes
@@ -174,6 +251,19 @@ async def update_application_status(
         
         db.commit()
         
+        audit_logger.log_request_event(
+            request,
+            event_type="application",
+            user_id=str(application.user_id),
+            action="status_updated",
+            details={
+                "application_id": application_id,
+                "old_status": old_status.value if old_status else None,
+                "new_status": status_enum.value,
+                "notes": notes
+            }
+        )
+        
         logger.info(
             "application_status_updated",
             application_id=application_id,
@@ -197,16 +287,16 @@ async def update_application_status(
 @router.get("/users")
 async def list_users(
     limit: int = Query(50, le=100),
-    offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """List all users."""
+    """List users, newest first; pass `next_cursor` back as `cursor` for the next page."""
     try:
-        users = db.query(User).order_by(
-            User.created_at.desc()
-        ).limit(limit).offset(offset).all()
+        users, next_cursor = keyset_page(
+            db.query(User), User.created_at, User.id, limit, cursor
+        )
         
-        return {
+        return ORJSONResponse({
             "users": [
                 {
                     "id": str(user.id),
@@ -217,22 +307,75 @@ async def list_users(
                     "created_at": user.created_at.isoformat()
                 }
                 for user in users
-            ]
-        }
+            ],
+            "next_cursor": next_cursor
+        })
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("list_users_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.put("/users/{user_id}/active")
+async def update_user_active_status(
+    user_id: str,
+    is_active: bool,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Activate or deactivate a user."""
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        
+        user.is_active = is_active
+        user.updated_at = datetime.utcnow()
+        
+        db.commit()
+        
+        # Cached principals would otherwise keep the old status until they expire
+        principal_cache.invalidate_user(user_id)
+        
+        audit_logger.log_request_event(
+            request,
+            event_type="user",
+            user_id=user_id,
+            action="activated" if is_active else "deactivated",
+            details={"is_active": is_active}
+        )
+        
+        logger.info(
+            "user_active_status_updated",
+            user_id=user_id,
+            is_active=is_active
+        )
+        
+        return {
+            "success": True,
+            "user_id": user_id,
+            "is_active": is_active
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("update_user_status_error", error=str(e))
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/conversations")
 async def list_conversations(
     status: Optional[str] = None,
     limit: int = Query(50, le=100),
-    offset: int = 0,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """List all conversations."""
+    """List conversations, newest first; pass `next_cursor` back as `cursor` for the next page."""
     try:
         query = db.query(Conversation)
         
@@ -240,11 +383,11 @@ async def list_conversations(
             from app.models.conversation import ConversationStatus
             query = query.filter(Conversation.status == ConversationStatus[status.upper()])
         
-        conversations = query.order_by(
-            Conversation.started_at.desc()
-        ).limit(limit).offset(offset).all()
+        conversations, next_cursor = keyset_page(
+            query, Conversation.started_at, Conversation.id, limit, cursor
+        )
         
-        return {
+        return ORJSONResponse({
             "conversations": [
                 {
                     "id": str(conv.id),
@@ -256,9 +399,12 @@ async def list_conversations(
                     "last_message_at": conv.last_message_at.isoformat() if conv.last_message_at else None
                 }
                 for conv in conversations
-            ]
-        }
+            ],
+            "next_cursor": next_cursor
+        })
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("list_conversations_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
@@ -270,9 +416,9 @@ async def get_overview_stats(db: Session = Depends(get_db)):
     try:
         from app.services.analytics_service import analytics_service
         
-        stats = await analytics_service.get_dashboard_stats(db)
+        stats = await run_in_thread(analytics_service.get_dashboard_stats, db)
         
-        return stats
+        return ORJSONResponse(stats)
         
     except Exception as e:
         logger.error("overview_stats_error", error=str(e))
@@ -1,12 +1,16 @@
 """Analytics and reporting endpoints."""
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from typing import Optional
 
 from app.utils.database import get_db
+from app.utils.executors import run_in_thread
 from app.utils.logger import get_logger
+from app.utils.responses import ORJSONResponse
 from app.services.analytics_service import analytics_service
+from app.services.export_service import export_service, COLUMNAR_DATASETS, MEDIA_TYPES
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -31,9 +35,9 @@ async def get_conversion_funnel(
         else:
             end = datetime.fromisoformat(end_date)
         
-        funnel = await analytics_service.get_conversion_funnel(db, start, end)
+        funnel = await run_in_thread(analytics_service.get_conversion_funnel, db, start, end)
         
-        return funnel
+        return ORJSONResponse(funnel)
         
     except Exception as e:
         logger.error("conversion_funnel_error", error=str(e))
@@ -58,9 +62,9 @@ async def get_agent_performance(
         else:
             end = datetime.fromisoformat(end_date)
         
-        performance = await analytics_service.get_agent_performance(db, start, end)
+        performance = await run_in_thread(analytics_service.get_agent_performance, db, start, end)
         
-        return performance
+        return ORJSONResponse(performance)
         
     except Exception as e:
         logger.error("agent_performance_error", error=str(e))
@@ -85,9 +89,9 @@ async def get_time_metrics(
         else:
             end = datetime.fromisoformat(end_date)
         
-        metrics = await analytics_service.get_time_metrics(db, start, end)
+        metrics = await run_in_thread(analytics_service.get_time_metrics, db, start, end)
         
-        return metrics
+        return ORJSONResponse(metrics)
         
     except Exception as e:
         logger.error("time_metrics_error", error=str(e))
@@ -95,29 +99,12 @@ async def get_time_metrics(
 
 
 @router.get("/dashboard")
-async def get_dashboard_analytics(db: Session = Depends(get_db)):
-    """Get complete dashboard analytics."""
+async def get_dashboard_analytics():
+    """Get complete dashboard analytics (cached; closed days come from daily rollups)."""
     try:
-        # Get current month date range
-        now = datetime.utcnow()
-        start_of_month = datetime(now.year, now.month, 1)
+        from app.services.rollup_service import rollup_service
         
-        # Get all metrics
-        funnel = await analytics_service.get_conversion_funnel(db, start_of_month, now)
-        agent_perf = await analytics_service.get_agent_performance(db, start_of_month, now)
-        time_metrics = await analytics_service.get_time_metrics(db, start_of_month, now)
-        dashboard_stats = await analytics_service.get_dashboard_stats(db)
-        
-        return {
-            "period": {
-                "start": start_of_month.isoformat(),
-                "end": now.isoformat()
-            },
-            "overview": dashboard_stats,
-            "conversion_funnel": funnel,
-            "agent_performance": agent_perf,
-            "time_metrics": time_metrics
-        }
+        return ORJSONResponse(await rollup_service.get_cached_dashboard())
         
     except Exception as e:
         logger.error("dashboard_analytics_error", error=str(e))
@@ -126,55 +113,62 @@ async def get_dashboard_analytics(db: Session = Depends(get_db)):
 
 @router.get("/export/applications")
 async def export_applications(
-    format: str = Query("csv", regex="^(csv|json)$"),
+    format: str = Query("csv", regex="^(csv|ndjson)$"),
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    db: Session = Depends(get_db)
+    compress: bool = False
 ):
-    """Export applications data."""
+    """
+    Export applications data as a streamed download.
+    
+    Rows are read from a server-side cursor and written batch by batch, so
+    memory stays flat however many applications match. Pass `compress=true`
+    for a gzipped file.
+    """
     try:
-        from app.models.loan_application import LoanApplication
-        
-        query = db.query(LoanApplication)
-        
-        if start_date:
-            query = query.filter(LoanApplication.created_at >= datetime.fromisoformat(start_date))
-        
-        if end_date:
-            query = query.filter(LoanApplication.created_at <= datetime.fromisoformat(end_date))
-        
-        applications = query.all()
-        
-        # Convert to export format
-        data = [
-            {
-                "application_number": app.application_number,
-                "status": app.status.value,
-                "requested_amount": float(app.requested_amount) if app.requested_amount else None,
-                "approved_amount": float(app.approved_amount) if app.approved_amount else None,
-                "credit_score": int(app.credit_score) if app.credit_score else None,
-                "created_at": app.created_at.isoformat()
-            }
-            for app in applications
-        ]
-        
-        if format == "json":
-            return {"applications": data}
-        else:
-            # Return CSV format (simplified)
-            import csv
-            import io
-            
-            output = io.StringIO()
-            if data:
-                writer = csv.DictWriter(output, fieldnames=data[0].keys())
-                writer.writeheader()
-                writer.writerows(data)
-            
-            return {"csv_data": output.getvalue()}
-        
-    except Exception as e:
-        logger.error("export_error", error=str(e))
-        raise HTTPException(status_code=500, detail=str(e))
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    
+    filename = f"applications.{format}"
+    media_type = MEDIA_TYPES[format]
+    if compress:
+        filename += ".gz"
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        export_service.stream_applications(format, start, end, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 
+@router.get("/export/columnar/{dataset}")
+async def export_columnar(
+    dataset: str,
+    format: str = Query("parquet", regex="^(parquet|arrow)$"),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None
+):
+    """
+    Export applications, conversations, messages or documents as typed
+    Parquet or Arrow IPC, written row group by row group from the cursor.
+    """
+    if dataset not in COLUMNAR_DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    
+    if not export_service.columnar_available:
+        raise HTTPException(status_code=501, detail="Columnar exports require pyarrow")
+    
+    try:
+        start = datetime.fromisoformat(start_date) if start_date else None
+        end = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    
+    return StreamingResponse(
+        export_service.stream_columnar(dataset, format, start, end),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.{format}"'}
+    )
@@ -1,5 +1,5 @@
 """Chat API endpoints."""
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
@@ -7,8 +7,10 @@ from datetime import datetime
 import uuid
 import hashlib
 
-from app.utils.database import get_db, get_mongo_db
+from app.utils.database import get_db
 from app.utils.logger import get_logger
+from app.utils.pagination import keyset_page
+from app.utils.responses import ORJSONResponse, conditional_response, make_etag
 from app.models.user import User, UserRole
 from app.models.conversation import Conversation, Message, ConversationStatus, MessageRole, AgentType
 from app.models.loan_application import LoanApplication, ApplicationStatus
@@ -18,7 +20,9 @@ from app.agents.verify_agent import VerifyAgent
 from app.agents.underwrite_agent import UnderwriteAgent
 from app.agents.sanction_agent import SanctionAgent
 from app.services.sentiment_service import sentiment_service
+from app.services.history_service import history_service
 from app.utils.cache import cache
+from app.config import settings
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -93,6 +97,7 @@ class ChatMessageResponse(BaseModel):
 class ConversationHistory(BaseModel):
     conversation_id: str
     messages: List[Dict[str, Any]]
+    last_seq: int
     status: str
     created_at: datetime
 
@@ -162,15 +167,8 @@ async def send_message(
         db.add(user_message)
         db.commit()
         
-        # Get conversation history from MongoDB
-        mongo_db = get_mongo_db()
-        history_collection = mongo_db["conversation_history"]
-        
-        history_doc = history_collection.find_one({"conversation_id": str(conversation.id)})
-        if history_doc:
-            conversation_history = history_doc.get("messages", [])
-        else:
-            conversation_history = []
+        # Recent conversation history from MongoDB (the agents read the last 10)
+        conversation_history = history_service.get_recent(str(conversation.id))
         
         # Add current message to history
         conversation_history.append({
@@ -218,6 +216,13 @@ async def send_message(
         conversation.last_message_at = datetime.utcnow()
         conversation.message_count += 1
         
+        # Update MongoDB history before committing the counters that
+        # version it, so a history ETag never describes a stale transcript
+        last_seq = history_service.append(str(conversation.id), [
+            {"role": "user", "content": request.message},
+            {"role": "assistant", "content": response_text}
+        ])
+        
         # Save assistant message
         assistant_message = Message(
             id=uuid.uuid4(),
@@ -230,17 +235,8 @@ async def send_message(
         db.add(assistant_message)
         db.commit()
         
-        # Update MongoDB history
-        conversation_history.append({
-            "role": "assistant",
-            "content": response_text
-        })
-        
-        history_collection.update_one(
-            {"conversation_id": str(conversation.id)},
-            {"$set": {"messages": conversation_history, "updated_at": datetime.utcnow()}},
-            upsert=True
-        )
+        # Wake long-polling history readers
+        history_service.notify(str(conversation.id), last_seq)
         
         # Cache session
         cache.set_session(str(conversation.id), updated_context)
@@ -251,13 +247,13 @@ async def send_message(
             agent=current_agent_type.value
         )
         
-        return ChatMessageResponse(
-            response=response_text,
-            conversation_id=str(conversation.id),
-            agent=current_agent_type.value,
-            sentiment=sentiment_result,
-            context=updated_context
-        )
+        return ORJSONResponse({
+            "response": response_text,
+            "conversation_id": str(conversation.id),
+            "agent": current_agent_type.value,
+            "sentiment": sentiment_result,
+            "context": updated_context
+        })
         
     except Exception as e:
         logger.error("chat_error", error=str(e))
@@ -267,30 +263,57 @@ async def send_message(
 @router.get("/history/{conversation_id}", response_model=ConversationHistory)
 async def get_conversation_history(
     conversation_id: str,
+    request: Request,
+    since: Optional[int] = Query(None, ge=0),
+    wait: int = Query(0, ge=0),
     db: Session = Depends(get_db)
 ):
-    """Get conversation history."""
-    try:
-        conversation = db.query(Conversation).filter(
+    """
+    Get conversation history (supports If-None-Match).
+    
+    With `since`, only messages whose `seq` is greater are returned; pass
+    the previous response's `last_seq`. Adding `wait` (seconds, capped at
+    HISTORY_LONG_POLL_MAX) holds the request until a newer message arrives
+    or the wait runs out.
+    """
+    def load_version():
+        return db.query(
+            Conversation.status,
+            Conversation.started_at,
+            Conversation.last_message_at,
+            Conversation.message_count
+        ).filter(
             Conversation.id == conversation_id
         ).first()
+    
+    try:
+        conversation = load_version()
         
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
-        # Get messages from MongoDB
-        mongo_db = get_mongo_db()
-        history_collection = mongo_db["conversation_history"]
+        if since is not None and wait > 0:
+            # Hand the DB connection back to the pool while parked
+            db.close()
+            timeout = min(wait, settings.HISTORY_LONG_POLL_MAX)
+            if await history_service.wait_for(conversation_id, since, timeout):
+                conversation = load_version()
         
-        history_doc = history_collection.find_one({"conversation_id": conversation_id})
-        messages = history_doc.get("messages", []) if history_doc else []
+        etag = make_etag(conversation_id, since, *conversation)
         
-        return ConversationHistory(
-            conversation_id=conversation_id,
-            messages=messages,
-            status=conversation.status.value,
-            created_at=conversation.started_at
-        )
+        def build_history():
+            # Get messages from MongoDB
+            messages, last_seq = history_service.get_messages(conversation_id, since or 0)
+            
+            return {
+                "conversation_id": conversation_id,
+                "messages": messages,
+                "last_seq": last_seq,
+                "status": conversation.status.value,
+                "created_at": conversation.started_at
+            }
+        
+        return conditional_response(request, etag, build_history)
         
     except HTTPException:
         raise
@@ -302,15 +325,21 @@ async def get_conversation_history(
 @router.get("/conversations/user/{user_id}")
 async def get_user_conversations(
     user_id: str,
+    limit: int = Query(50, le=100),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    """Get all conversations for a user."""
+    """Get a user's conversations, newest first; pass `next_cursor` back as `cursor` for more."""
     try:
-        conversations = db.query(Conversation).filter(
-            Conversation.user_id == user_id
-        ).order_by(Conversation.started_at.desc()).all()
+        conversations, next_cursor = keyset_page(
+            db.query(Conversation).filter(Conversation.user_id == user_id),
+            Conversation.started_at,
+            Conversation.id,
+            limit,
+            cursor
+        )
         
-        return {
+        return ORJSONResponse({
             "user_id": user_id,
             "conversations": [
                 {
@@ -321,9 +350,12 @@ async def get_user_conversations(
                     "message_count": conv.message_count
                 }
                 for conv in conversations
-            ]
-        }
+            ],
+            "next_cursor": next_cursor
+        })
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error("get_conversations_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
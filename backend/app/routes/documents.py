@@ -1,16 +1,16 @@
 """Document upload and management endpoints."""
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
-from datetime import datetime
 import uuid
 
 from app.utils.database import get_db
 from app.utils.logger import get_logger
+from app.utils.responses import ORJSONResponse, conditional_response, make_etag
 from app.models.loan_application import Document
-from app.services.document_service import document_service
-from app.config import settings
+from app.services.document_service import document_service, FILE_TOO_LARGE
+from app.utils.audit_log import audit_logger
 
 logger = get_logger(__name__)
 router = APIRouter()
@@ -23,6 +23,7 @@ class DocumentUploadResponse(BaseModel):
     filename: str
     document_type: str
     message: str
+    deduplicated: bool = False
 
 
 class DocumentVerificationResponse(BaseModel):
@@ -36,6 +37,7 @@ class DocumentVerificationResponse(BaseModel):
 
 @router.post("/upload", response_model=DocumentUploadResponse)
 async def upload_document(
+    request: Request,
     file: UploadFile = File(...),
     document_type: str = Form(...),
     user_id: str = Form(...),
@@ -44,22 +46,21 @@ async def upload_document(
 ):
     """Upload a document."""
     try:
-        # Validate file size
-        file_content = await file.read()
-        if len(file_content) > settings.MAX_UPLOAD_SIZE:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail="File size exceeds maximum allowed"
-            )
-        
-        # Save document
+        # Save document (streamed to disk; size is enforced while copying)
         save_result = await document_service.save_document(
-            file_content=file_content,
+            db=db,
+            file=file,
             filename=file.filename,
             document_type=document_type,
             user_id=user_id
         )
         
+        if save_result.get("error") == FILE_TOO_LARGE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail="File size exceeds maximum allowed"
+            )
+        
         if not save_result["success"]:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -74,27 +75,59 @@ async def upload_document(
             document_type=document_type,
             file_name=file.filename,
             file_path=save_result["file_path"],
-            file_size=len(file_content),
-            mime_type=file.content_type or "application/octet-stream"
+            file_size=save_result["file_size"],
+            mime_type=file.content_type or "application/octet-stream",
+            content_hash=save_result["sha256"]
         )
         
+        # Identical content this user already had verified: reuse the result,
+        # skip OCR/fraud checks. Content another user uploaded is flagged.
+        prior = None
+        if save_result["deduplicated"]:
+            prior = document_service.find_verified_duplicate(
+                db, save_result["sha256"], document_type, user_id
+            )
+            if prior is not None:
+                document_service.apply_verification(document, document_service.reused_verification(prior))
+            document_service.flag_shared_content(db, document)
+        
         db.add(document)
         db.commit()
         db.refresh(document)
         
+        audit_logger.log_request_event(
+            request,
+            event_type="document",
+            user_id=user_id,
+            action="uploaded",
+            details={
+                "document_id": str(document.id),
+                "application_id": application_id,
+                "document_type": document_type,
+                "deduplicated": save_result["deduplicated"]
+            }
+        )
+        
         logger.info(
             "document_uploaded",
             document_id=str(document.id),
             document_type=document_type,
-            user_id=user_id
+            user_id=user_id,
+            deduplicated=save_result["deduplicated"],
+            reused_verification=prior is not None
         )
         
+        message = "Document uploaded successfully"
+        if prior is not None:
+            message = "Document already on file; previous verification reused"
+        
         return DocumentUploadResponse(
             success=True,
             document_id=str(document.id),
             filename=file.filename,
             document_type=document_type,
-            message="Document uploaded successfully"
+            message=message,
+            deduplicated=save_result["deduplicated"]
         )
         
     except HTTPException:
@@ -107,6 +140,7 @@ async def upload_document(
 @router.post("/verify/{document_id}", response_model=DocumentVerificationResponse)
 async def verify_document(
     document_id: str,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """Verify a document."""
@@ -116,22 +150,37 @@ async def verify_document(
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Verify document
-        verification_result = await document_service.verify_document(
-            document_id=str(document.id),
-            document_type=document.document_type
+        # Verify document, reusing the result for content verified before
+        prior = document_service.find_verified_duplicate(
+            db, document.content_hash, document.document_type, document.user_id, exclude_id=document.id
         )
+        if prior is not None:
+            verification_result = document_service.reused_verification(prior)
+        else:
+            verification_result = await document_service.verify_document(
+                document_id=str(document.id),
+                document_type=document.document_type
+            )
         
         # Update document record
-        document.is_verified = verification_result["valid"]
-        document.verified_at = datetime.utcnow() if verification_result["valid"] else None
-        document.extracted_data = verification_result.get("extracted_data", {})
-        document.confidence_score = verification_result.get("confidence_score", 0)
-        document.fraud_flags = verification_result.get("fraud_flags", [])
-        document.is_suspicious = len(verification_result.get("fraud_flags", [])) > 0
+        document_service.apply_verification(document, verification_result)
+        if document_service.flag_shared_content(db, document):
+            verification_result["fraud_flags"] = document.fraud_flags
         
         db.commit()
         
+        audit_logger.log_request_event(
+            request,
+            event_type="document",
+            user_id=str(document.user_id),
+            action="verified",
+            details={
+                "document_id": document_id,
+                "valid": verification_result["valid"],
+                "reused_from": verification_result.get("reused_from")
+            }
+        )
+        
         logger.info(
             "document_verified",
             document_id=document_id,
@@ -157,15 +206,14 @@ async def verify_document(
 @router.get("/application/{application_id}")
 async def get_application_documents(
     application_id: str,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    """Get all documents for an application."""
+    """Get all documents for an application (supports If-None-Match)."""
     try:
-        documents = db.query(Document).filter(
-            Document.application_id == application_id
-        ).all()
+        etag = make_etag(application_id, *document_service.get_documents_version(db, application_id))
         
-        return {
+        return conditional_response(request, etag, lambda: {
             "application_id": application_id,
             "documents": [
                 {
@@ -177,9 +225,11 @@ async def get_application_documents(
                     "verified_at": doc.verified_at.isoformat() if doc.verified_at else None,
                     "is_suspicious": doc.is_suspicious
                 }
-                for doc in documents
+                for doc in db.query(Document).filter(
+                    Document.application_id == application_id
+                ).all()
             ]
-        }
+        })
         
     except Exception as e:
         logger.error("get_documents_error", error=str(e))
@@ -189,6 +239,7 @@ async def get_application_documents(
 @router.delete("/{document_id}")
 async def delete_document(
     document_id: str,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """Delete a document."""
@@ -197,12 +248,19 @@ async def delete_document(
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         
-        # Delete file from storage (implement if needed)
-        
-        # Delete database record
+        # Delete database record; its file goes after the commit once nothing references it
         db.delete(document)
+        document_service.delete_file(db, document)
         db.commit()
         
+        audit_logger.log_request_event(
+            request,
+            event_type="document",
+            user_id=str(document.user_id),
+            action="deleted",
+            details={"document_id": document_id, "document_type": document.document_type}
+        )
+        
         logger.info("document_deleted", document_id=document_id)
         
         return {"success": True, "message": "Document deleted successfully"}
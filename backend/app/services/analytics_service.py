@@ -1,128 +1,223 @@
 """Analytics service for business intelligence."""
 from typing import Dict, Any, List
+from sqlalchemy import and_, extract, func
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from app.models.conversation import Conversation, ConversationStatus
+from app.models.conversation import (
+    AgentType,
+    Conversation,
+    ConversationStatus,
+    Message,
+    MessageRole
+)
 from app.models.loan_application import LoanApplication, ApplicationStatus
 from app.models.metrics import ConversionMetric
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# conversation_state->>'stage', backed by ix_conversations_stage_started_at
+CONVERSATION_STAGE = Conversation.conversation_state["stage"].astext
+
+# Agents reported by get_agent_performance (the master router is excluded)
+AGENT_TYPES = (AgentType.ENGAGE, AgentType.VERIFY, AgentType.UNDERWRITE, AgentType.SANCTION)
+
+# Durations reported by get_time_metrics as (from, to) timestamps
+TIME_STAGES = {
+    "created_to_sanctioned": (LoanApplication.created_at, LoanApplication.sanctioned_at),
+    "created_to_submitted": (LoanApplication.created_at, LoanApplication.submitted_at),
+    "submitted_to_approved": (LoanApplication.submitted_at, LoanApplication.approved_at),
+    "approved_to_sanctioned": (LoanApplication.approved_at, LoanApplication.sanctioned_at),
+}
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+# Count fields of the conversion funnel (additive across date ranges)
+FUNNEL_COUNTS = (
+    "total_conversations",
+    "qualified_leads",
+    "total_applications",
+    "documents_submitted",
+    "applications_submitted",
+    "approved",
+    "sanctioned",
+)
+
 
 class AnalyticsService:
-    """Service for analytics and metrics."""
+    """
+    Service for analytics and metrics.
+    
+    Methods issue blocking SQL on the session they are given; async callers
+    run them with `run_in_thread`.
+    """
+    
+    @staticmethod
+    def build_funnel(counts: Dict[str, int]) -> Dict[str, Any]:
+        """Add conversion rates to funnel counts (see FUNNEL_COUNTS)."""
+        total_conversations = counts["total_conversations"]
+        qualified = counts["qualified_leads"]
+        docs_submitted = counts["documents_submitted"]
+        apps_submitted = counts["applications_submitted"]
+        approved = counts["approved"]
+        sanctioned = counts["sanctioned"]
+        
+        return {
+            **counts,
+            "conversion_rates": {
+                "qualification_rate": (qualified / total_conversations * 100) if total_conversations > 0 else 0,
+                "document_submission_rate": (docs_submitted / qualified * 100) if qualified > 0 else 0,
+                "approval_rate": (approved / apps_submitted * 100) if apps_submitted > 0 else 0,
+                "overall_conversion": (sanctioned / total_conversations * 100) if total_conversations > 0 else 0
+            }
+        }
+    
+    @staticmethod
+    def empty_agent_stats() -> Dict[str, Dict[str, Any]]:
+        """Zeroed get_agent_performance result, one entry per agent."""
+        return {
+            agent.value: {
+                "interactions": 0,
+                "handoffs": 0,
+                "by_status": {},
+                "turns": 0,
+                "handoffs_in": 0,
+                "avg_handoff_latency_seconds": None
+            }
+            for agent in AGENT_TYPES
+        }
     
-    async def get_conversion_funnel(
+    def get_conversion_funnel(
         self,
         db: Session,
         start_date: datetime,
         end_date: datetime
     ) -> Dict[str, Any]:
-        """Get conversion funnel metrics."""
+        """Get conversion funnel metrics (one scan per table)."""
         try:
-            # Total conversations
-            total_conversations = db.query(Conversation).filter(
+            # Conversations: total and qualified in one pass
+            total_conversations, qualified = db.query(
+                func.count(),
+                func.count().filter(CONVERSATION_STAGE == "qualified")
+            ).select_from(Conversation).filter(
                 Conversation.started_at >= start_date,
                 Conversation.started_at <= end_date
-            ).count()
+            ).one()
             
-            # Qualified leads (moved past initial engagement)
-            qualified = db.query(Conversation).filter(
-                Conversation.started_at >= start_date,
-                Conversation.started_at <= end_date,
-                Conversation.conversation_state.contains({"stage": "qualified"})
-            ).count()
-            
-            # Documents submitted
-            docs_submitted = db.query(LoanApplication).filter(
-                LoanApplication.created_at >= start_date,
-                LoanApplication.created_at <= end_date,
-                LoanApplication.status.in_([
+            # Applications: every funnel step in one pass
+            total_applications, docs_submitted, apps_submitted, approved, sanctioned = db.query(
+                func.count(),
+                func.count().filter(LoanApplication.status.in_([
                     ApplicationStatus.DOCUMENTS_SUBMITTED,
                     ApplicationStatus.UNDER_VERIFICATION,
                     ApplicationStatus.UNDER_REVIEW,
                     ApplicationStatus.APPROVED,
                     ApplicationStatus.SANCTIONED
-                ])
-            ).count()
-            
-            # Applications submitted
-            apps_submitted = db.query(LoanApplication).filter(
-                LoanApplication.created_at >= start_date,
-                LoanApplication.created_at <= end_date,
-                LoanApplication.submitted_at.isnot(None)
-            ).count()
-            
-            # Approved
-            approved = db.query(LoanApplication).filter(
-                LoanApplication.created_at >= start_date,
-                LoanApplication.created_at <= end_date,
-                LoanApplication.status.in_([
+                ])),
+                func.count().filter(LoanApplication.submitted_at.isnot(None)),
+                func.count().filter(LoanApplication.status.in_([
                     ApplicationStatus.APPROVED,
                     ApplicationStatus.SANCTIONED
-                ])
-            ).count()
-            
-            # Sanctioned
-            sanctioned = db.query(LoanApplication).filter(
+                ])),
+                func.count().filter(LoanApplication.status == ApplicationStatus.SANCTIONED)
+            ).select_from(LoanApplication).filter(
                 LoanApplication.created_at >= start_date,
-                LoanApplication.created_at <= end_date,
-                LoanApplication.status == ApplicationStatus.SANCTIONED
-            ).count()
+                LoanApplication.created_at <= end_date
+            ).one()
             
-            # Calculate conversion rates
-            funnel = {
+            return self.build_funnel({
                 "total_conversations": total_conversations,
                 "qualified_leads": qualified,
+                "total_applications": total_applications,
                 "documents_submitted": docs_submitted,
                 "applications_submitted": apps_submitted,
                 "approved": approved,
-                "sanctioned": sanctioned,
-                "conversion_rates": {
-                    "qualification_rate": (qualified / total_conversations * 100) if total_conversations > 0 else 0,
-                    "document_submission_rate": (docs_submitted / qualified * 100) if qualified > 0 else 0,
-                    "approval_rate": (approved / apps_submitted * 100) if apps_submitted > 0 else 0,
-                    "overall_conversion": (sanctioned / total_conversations * 100) if total_conversations > 0 else 0
-                }
-            }
-            
-            return funnel
+                "sanctioned": sanctioned
+            })
             
         except Exception as e:
             logger.error("conversion_funnel_error", error=str(e))
             return {}
     
-    async def get_agent_performance(
+    def get_agent_performance(
         self,
         db: Session,
         start_date: datetime,
         end_date: datetime
     ) -> Dict[str, Any]:
-        """Get agent performance metrics."""
+        """
+        Get agent performance metrics.
+        
+        `interactions`/`handoffs` count conversations by their current agent
+        (handoffs = completed). `turns` counts assistant messages each agent
+        produced; `handoffs_in` counts turns where the agent took over from a
+        different one, and `avg_handoff_latency_seconds` is the gap between
+        the previous agent's last turn and this agent's first.
+        """
         try:
-            # Query conversations by current agent
-            conversations = db.query(Conversation).filter(
+            agent_stats = self.empty_agent_stats()
+            
+            # Conversations grouped by (current_agent, status)
+            status_counts = db.query(
+                Conversation.current_agent,
+                Conversation.status,
+                func.count()
+            ).filter(
                 Conversation.started_at >= start_date,
                 Conversation.started_at <= end_date
+            ).group_by(
+                Conversation.current_agent,
+                Conversation.status
             ).all()
             
-            # Aggregate by agent
-            agent_stats = {
-                "engage": {"interactions": 0, "handoffs": 0},
-                "verify": {"interactions": 0, "handoffs": 0},
-                "underwrite": {"interactions": 0, "handoffs": 0},
-                "sanction": {"interactions": 0, "handoffs": 0}
+            for agent, conv_status, count in status_counts:
+                stats = agent_stats.get(agent.value if agent else None)
+                if stats is None:
+                    continue
+                stats["interactions"] += count
+                if conv_status is not None:
+                    stats["by_status"][conv_status.value] = count
+                if conv_status == ConversationStatus.COMPLETED:
+                    stats["handoffs"] += count
+            
+            # Assistant turns with the previous turn's agent and timestamp
+            previous = {
+                "partition_by": Message.conversation_id,
+                "order_by": Message.created_at
             }
+            turns = db.query(
+                Message.agent_type.label("agent_type"),
+                Message.created_at.label("created_at"),
+                func.lag(Message.agent_type).over(**previous).label("prev_agent"),
+                func.lag(Message.created_at).over(**previous).label("prev_at")
+            ).join(
+                Conversation, Conversation.id == Message.conversation_id
+            ).filter(
+                Conversation.started_at >= start_date,
+                Conversation.started_at <= end_date,
+                Message.role == MessageRole.ASSISTANT,
+                Message.agent_type.isnot(None)
+            ).subquery()
+            
+            is_handoff = and_(
+                turns.c.prev_agent.isnot(None),
+                turns.c.prev_agent != turns.c.agent_type
+            )
+            turn_counts = db.query(
+                turns.c.agent_type,
+                func.count(),
+                func.count().filter(is_handoff),
+                func.avg(
+                    extract("epoch", turns.c.created_at - turns.c.prev_at)
+                ).filter(is_handoff)
+            ).group_by(turns.c.agent_type).all()
             
-            for conv in conversations:
-                agent = conv.current_agent.value if conv.current_agent else "master"
-                if agent in agent_stats:
-                    agent_stats[agent]["interactions"] += 1
-                    
-                    # Check if conversation progressed (successful handoff)
-                    if conv.status == ConversationStatus.COMPLETED:
-                        agent_stats[agent]["handoffs"] += 1
+            for agent, turn_count, handoffs_in, latency in turn_counts:
+                stats = agent_stats.get(agent.value)
+                if stats is None:
+                    continue
+                stats["turns"] = turn_count
+                stats["handoffs_in"] = handoffs_in
+                stats["avg_handoff_latency_seconds"] = float(latency) if latency is not None else None
             
             return agent_stats
             
@@ -130,71 +225,90 @@ class AnalyticsService:
             logger.error("agent_performance_error", error=str(e))
             return {}
     
-    async def get_time_metrics(
+    def get_time_metrics(
         self,
         db: Session,
         start_date: datetime,
         end_date: datetime
     ) -> Dict[str, Any]:
-        """Get time-based metrics."""
+        """
+        Get time-based metrics (minutes), computed in a single query.
+        
+        The top-level fields describe created -> sanctioned; `stages` breaks
+        the journey down into created -> submitted -> approved -> sanctioned.
+        Each duration only counts applications that reached both ends.
+        """
         try:
-            applications = db.query(LoanApplication).filter(
+            columns = []
+            for stage, (start_column, end_column) in TIME_STAGES.items():
+                minutes = extract("epoch", end_column - start_column) / 60
+                columns.extend([
+                    func.count(minutes),
+                    func.avg(minutes),
+                    func.min(minutes),
+                    func.max(minutes),
+                    *(
+                        func.percentile_cont(quantile).within_group(minutes)
+                        for quantile in PERCENTILES.values()
+                    )
+                ])
+            
+            row = db.query(*columns).filter(
                 LoanApplication.created_at >= start_date,
-                LoanApplication.created_at <= end_date,
-                LoanApplication.sanctioned_at.isnot(None)
-            ).all()
+                LoanApplication.created_at <= end_date
+            ).one()
             
-            if not applications:
-                return {
-                    "avg_time_to_sanction_minutes": 0,
-                    "min_time_minutes": 0,
-                    "max_time_minutes": 0
+            # Unpack the flat row into one dict per stage
+            width = 4 + len(PERCENTILES)
+            stages = {}
+            for i, stage in enumerate(TIME_STAGES):
+                count, avg, low, high, *quantiles = row[i * width:(i + 1) * width]
+                stages[stage] = {
+                    "count": count,
+                    "avg_minutes": float(avg or 0),
+                    "min_minutes": float(low or 0),
+                    "max_minutes": float(high or 0),
+                    **{
+                        f"{name}_minutes": float(value or 0)
+                        for name, value in zip(PERCENTILES, quantiles)
+                    }
                 }
             
-            times = []
-            for app in applications:
-                time_diff = (app.sanctioned_at - app.created_at).total_seconds() / 60
-                times.append(time_diff)
-            
+            total = stages.pop("created_to_sanctioned")
             return {
-                "avg_time_to_sanction_minutes": sum(times) / len(times),
-                "min_time_minutes": min(times),
-                "max_time_minutes": max(times),
-                "median_time_minutes": sorted(times)[len(times) // 2]
+                "avg_time_to_sanction_minutes": total["avg_minutes"],
+                "min_time_minutes": total["min_minutes"],
+                "max_time_minutes": total["max_minutes"],
+                "median_time_minutes": total["p50_minutes"],
+                "p90_time_minutes": total["p90_minutes"],
+                "p99_time_minutes": total["p99_minutes"],
+                "sanctioned_count": total["count"],
+                "stages": stages
             }
             
         except Exception as e:
             logger.error("time_metrics_error", error=str(e))
             return {}
     
-    async def get_dashboard_stats(
+    def get_dashboard_stats(
         self,
         db: Session
     ) -> Dict[str, Any]:
-        """Get dashboard statistics."""
+        """Get dashboard statistics (one scan per table)."""
         try:
-            today = datetime.utcnow().date()
-            
-            # Today's stats
-            today_conversations = db.query(Conversation).filter(
-                Conversation.started_at >= datetime.combine(today, datetime.min.time())
-            ).count()
-            
-            today_applications = db.query(LoanApplication).filter(
-                LoanApplication.created_at >= datetime.combine(today, datetime.min.time())
-            ).count()
-            
-            # Total stats
-            total_conversations = db.query(Conversation).count()
-            total_applications = db.query(LoanApplication).count()
-            total_sanctioned = db.query(LoanApplication).filter(
-                LoanApplication.status == ApplicationStatus.SANCTIONED
-            ).count()
-            
-            # Active conversations
-            active_conversations = db.query(Conversation).filter(
-                Conversation.status == ConversationStatus.ACTIVE
-            ).count()
+            today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+            
+            total_conversations, today_conversations, active_conversations = db.query(
+                func.count(),
+                func.count().filter(Conversation.started_at >= today_start),
+                func.count().filter(Conversation.status == ConversationStatus.ACTIVE)
+            ).select_from(Conversation).one()
+            
+            total_applications, today_applications, total_sanctioned = db.query(
+                func.count(),
+                func.count().filter(LoanApplication.created_at >= today_start),
+                func.count().filter(LoanApplication.status == ApplicationStatus.SANCTIONED)
+            ).select_from(LoanApplication).one()
             
             return {
                 "today": {
@@ -0,0 +1,189 @@
+"""Content-addressable file store for uploaded documents."""
+from concurrent.futures import Executor, Future
+from typing import Callable, Optional, Tuple
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session, SessionTransaction
+import aiofiles.os
+import asyncio
+import os
+import time
+import uuid
+from app.config import settings
+from app.models.loan_application import Document
+from app.utils.database import SessionLocal
+from app.utils.executors import worker_pools
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Seconds between attempts to take a busy digest lock from the event loop
+LOCK_POLL_INTERVAL = 0.05
+
+# Session.info keys: callbacks run once the session's transaction commits or is abandoned
+_ON_COMMIT = "content_store_on_commit"
+_ON_ROLLBACK = "content_store_on_rollback"
+
+
+def _run_callbacks(callbacks) -> None:
+    """Run deferred file operations; errors are logged, never raised into the commit."""
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error("content_store_callback_error", error=str(e))
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(db: Session) -> None:
+    db.info.pop(_ON_ROLLBACK, None)
+    _run_callbacks(db.info.pop(_ON_COMMIT, ()))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _after_transaction_end(db: Session, transaction: SessionTransaction) -> None:
+    if transaction.parent is not None:
+        return
+    # Still pending here means the transaction ended without committing
+    db.info.pop(_ON_COMMIT, None)
+    _run_callbacks(db.info.pop(_ON_ROLLBACK, ()))
+
+
+def _begin(db: Session) -> None:
+    """Start the transaction a callback belongs to, so its end always fires the hooks."""
+    if not db.in_transaction():
+        db.begin()
+
+
+def on_commit(db: Session, callback: Callable[[], None]) -> None:
+    """Run `callback` after `db`'s current transaction commits."""
+    _begin(db)
+    db.info.setdefault(_ON_COMMIT, []).append(callback)
+
+
+def on_rollback(db: Session, callback: Callable[[], None]) -> None:
+    """Run `callback` if `db`'s current transaction ends without committing."""
+    _begin(db)
+    db.info.setdefault(_ON_ROLLBACK, []).append(callback)
+
+
+class ContentStore:
+    """
+    Files stored once per distinct content, keyed by SHA-256.
+    
+    An object lives at `<root>/<h[0:2]>/<h[2:4]>/<h>`; the two shard levels
+    keep directories small. Objects carry no reference count of their own:
+    the Document rows with a matching `content_hash` are the references,
+    and an object is removed when the last of them is deleted. Files only
+    change once the database outcome is known: an object created for a
+    transaction that never commits is removed again, and a released object
+    is unlinked after the delete commits. Both take a Postgres advisory
+    lock on the digest and re-count references first, as does storing, so
+    a removal cannot race an upload that reuses the object.
+    
+    An upload holds the lock until its request commits, across awaits, so
+    the event loop never waits for it: `put` polls with a try-lock and
+    removals run on a worker thread, both giving up after `lock_timeout`.
+    """
+    
+    def __init__(
+        self,
+        root: str = None,
+        lock_timeout: float = None,
+        executor: Optional[Executor] = None
+    ):
+        """Initialize content store (removals default to the shared thread pool)."""
+        self.root = root or os.path.join(settings.UPLOAD_DIR, "objects")
+        self.lock_timeout = lock_timeout or settings.CONTENT_LOCK_TIMEOUT
+        self._executor = executor
+        os.makedirs(self.root, exist_ok=True)
+    
+    def path_for(self, digest: str) -> str:
+        """Sharded path of the object with this SHA-256 hex digest."""
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+    
+    def temp_path(self) -> str:
+        """Fresh temp file path on the store's filesystem (for atomic renames)."""
+        return os.path.join(self.root, f"{uuid.uuid4().hex}.part")
+    
+    def try_lock(self, db: Session, digest: str) -> bool:
+        """Take the digest's advisory lock until `db`'s transaction ends, if it is free."""
+        return db.execute(select(func.pg_try_advisory_xact_lock(func.hashtext(digest)))).scalar()
+    
+    async def acquire(self, db: Session, digest: str) -> None:
+        """Take the digest lock without blocking the event loop; TimeoutError after `lock_timeout`."""
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.try_lock(db, digest):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"content object {digest} is locked")
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+    
+    def lock(self, db: Session, digest: str) -> None:
+        """Wait for the digest lock until `db`'s transaction ends (worker threads only)."""
+        timeout_ms = int(self.lock_timeout * 1000)
+        db.execute(select(func.set_config("lock_timeout", f"{timeout_ms}ms", True)))
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(digest))))
+    
+    def ref_count(self, db: Session, digest: str) -> int:
+        """Number of Document rows referencing the object."""
+        return db.query(func.count()).select_from(Document).filter(
+            Document.content_hash == digest
+        ).scalar()
+    
+    async def put(self, db: Session, temp_path: str, digest: str) -> Tuple[str, bool]:
+        """
+        Move a hashed temp file into the store.
+        
+        Returns the object path and whether identical content was already
+        stored (the temp file is then discarded). The caller should insert
+        the referencing Document row in the same transaction; a new object
+        is removed again if that transaction does not commit.
+        """
+        await self.acquire(db, digest)
+        path = self.path_for(digest)
+        if await aiofiles.os.path.exists(path):
+            await aiofiles.os.remove(temp_path)
+            return path, True
+        
+        await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+        await aiofiles.os.replace(temp_path, path)
+        on_rollback(db, lambda: self.remove_later(digest))
+        return path, False
+    
+    def release(self, db: Session, digest: str) -> None:
+        """Remove the object once the caller's delete commits, if nothing references it then."""
+        on_commit(db, lambda: self.remove_later(digest))
+    
+    def remove_later(self, digest: str) -> Future:
+        """Run `remove_if_unreferenced` on a worker thread (hooks fire on the event loop)."""
+        executor = self._executor or worker_pools.thread_pool
+        future = executor.submit(self.remove_if_unreferenced, digest)
+        future.add_done_callback(lambda done: _log_removal_error(digest, done))
+        return future
+    
+    def remove_if_unreferenced(self, digest: str) -> bool:
+        """Unlink the object under its lock if no Document row references it; returns whether it did."""
+        db = SessionLocal()
+        try:
+            self.lock(db, digest)
+            if self.ref_count(db, digest) > 0:
+                return False
+            
+            try:
+                os.remove(self.path_for(digest))
+            except FileNotFoundError:
+                pass
+            logger.info("content_object_removed", digest=digest)
+            return True
+        finally:
+            # Ends the transaction, releasing the lock
+            db.close()
+
+
+def _log_removal_error(digest: str, future: Future) -> None:
+    """Log failed background removals; the object stays until its next release."""
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("content_object_removal_error", digest=digest, error=str(future.exception()))
+
+
+# Global content store instance
+content_store = ContentStore()
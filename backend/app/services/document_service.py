@@ -1,15 +1,31 @@
 """Document processing and management service."""
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
+from fastapi import UploadFile
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+import aiofiles
+import aiofiles.os
+import hashlib
 import os
-import uuid
 from datetime import datetime
 from app.config import settings
+from app.models.loan_application import Document
 from app.utils.logger import get_logger
+from app.services.content_store import content_store, on_commit
 from app.services.ocr_service import ocr_service
 from app.services.fraud_detection_service import fraud_detection_service
 
 logger = get_logger(__name__)
 
+# Bytes copied from the upload per read/write
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# save_document error for uploads over MAX_UPLOAD_SIZE
+FILE_TOO_LARGE = "file_too_large"
+
+# Fraud flag for content another user has also uploaded
+SHARED_CONTENT_FLAG = "content_uploaded_by_another_user"
+
 
 class DocumentService:
     """Service for document processing."""
@@ -19,41 +35,190 @@ class DocumentService:
         self.upload_dir = settings.UPLOAD_DIR
         os.makedirs(self.upload_dir, exist_ok=True)
     
+    def get_documents_version(self, db: Session, application_id) -> Tuple:
+        """
+        Cheap version tuple for an application's documents.
+        
+        Changes whenever a document is added, removed or (re)verified, so
+        it can back an ETag without loading the document rows.
+        """
+        return db.query(
+            func.count(),
+            func.max(Document.uploaded_at),
+            func.max(Document.verified_at),
+            func.count().filter(Document.is_verified.is_(True)),
+            func.count().filter(Document.is_suspicious.is_(True))
+        ).filter(
+            Document.application_id == application_id
+        ).one()
+    
     async def save_document(
         self,
-        file_content: bytes,
+        db: Session,
+        file: UploadFile,
         filename: str,
         document_type: str,
-        user_id: str
+        user_id: str,
+        max_size: int = None
     ) -> Dict[str, Any]:
-        """Save uploaded document."""
+        """
+        Save uploaded document into the content store.
+        
+        The upload is copied in UPLOAD_CHUNK_SIZE chunks to a temp file,
+        hashing and counting bytes on the way, and then renamed to its
+        content address, so only whole files ever appear there. Content
+        already on file is not written again (`deduplicated`). Uploads over
+        `max_size` (default MAX_UPLOAD_SIZE) are abandoned with error
+        FILE_TOO_LARGE as soon as the limit is crossed. The caller must
+        add the Document row (with `content_hash`) in `db`'s transaction.
+        """
+        max_size = max_size or settings.MAX_UPLOAD_SIZE
+        temp_path = None
         try:
-            # Generate unique filename
-            file_ext = os.path.splitext(filename)[1]
-            unique_filename = f"{user_id}_{document_type}_{uuid.uuid4()}{file_ext}"
-            file_path = os.path.join(self.upload_dir, unique_filename)
+            if file.size is not None and file.size > max_size:
+                return {"success": False, "error": FILE_TOO_LARGE}
+            
+            temp_path = content_store.temp_path()
             
-            # Save file
-            with open(file_path, "wb") as f:
-                f.write(file_content)
+            # Stream to the temp file without holding the whole upload
+            digest = hashlib.sha256()
+            file_size = 0
+            async with aiofiles.open(temp_path, "wb") as f:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    file_size += len(chunk)
+                    if file_size > max_size:
+                        return {"success": False, "error": FILE_TOO_LARGE}
+                    digest.update(chunk)
+                    await f.write(chunk)
+            
+            content_hash = digest.hexdigest()
+            file_path, deduplicated = await content_store.put(db, temp_path, content_hash)
+            temp_path = None
             
             logger.info(
                 "document_saved",
-                filename=unique_filename,
+                filename=filename,
                 document_type=document_type,
-                user_id=user_id
+                user_id=user_id,
+                file_size=file_size,
+                content_hash=content_hash,
+                deduplicated=deduplicated
             )
             
             return {
                 "success": True,
                 "file_path": file_path,
-                "filename": unique_filename,
-                "document_type": document_type
+                "filename": content_hash,
+                "document_type": document_type,
+                "file_size": file_size,
+                "sha256": content_hash,
+                "deduplicated": deduplicated
             }
             
         except Exception as e:
             logger.error("document_save_error", error=str(e))
             return {"success": False, "error": str(e)}
+        
+        finally:
+            if temp_path is not None:
+                try:
+                    await aiofiles.os.remove(temp_path)
+                except OSError:
+                    pass
+    
+    def delete_file(self, db: Session, document: Document) -> None:
+        """
+        Drop a deleted document's file once the delete commits.
+        
+        Call after deleting the row and before committing. Stored content
+        is only removed once no other document references it.
+        """
+        if document.content_hash:
+            content_store.release(db, document.content_hash)
+            return
+        
+        # Uploads from before content addressing own their file
+        file_path = document.file_path
+        on_commit(db, lambda: self._remove_file(file_path))
+    
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        """Remove a file that may already be gone."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    
+    def find_verified_duplicate(
+        self,
+        db: Session,
+        content_hash: Optional[str],
+        document_type: str,
+        user_id,
+        exclude_id=None
+    ) -> Optional[Document]:
+        """Latest completed verification of identical content of the same type and user."""
+        if not content_hash:
+            return None
+        
+        # Another user's verification never vouches for this user's upload
+        query = db.query(Document).filter(
+            Document.content_hash == content_hash,
+            Document.document_type == document_type,
+            Document.user_id == user_id,
+            Document.confidence_score.isnot(None),
+            Document.extracted_data != {}
+        )
+        if exclude_id is not None:
+            query = query.filter(Document.id != exclude_id)
+        
+        return query.order_by(Document.uploaded_at.desc()).first()
+    
+    def flag_shared_content(self, db: Session, document: Document) -> bool:
+        """
+        Mark a document suspicious if another user uploaded identical content.
+        
+        Call after any `apply_verification`, which resets `is_suspicious`.
+        Returns whether the document was flagged.
+        """
+        if not document.content_hash:
+            return False
+        
+        shared = db.query(
+            db.query(Document).filter(
+                Document.content_hash == document.content_hash,
+                Document.user_id != document.user_id
+            ).exists()
+        ).scalar()
+        if not shared:
+            return False
+        
+        document.is_suspicious = True
+        if SHARED_CONTENT_FLAG not in (document.fraud_flags or []):
+            document.fraud_flags = [*(document.fraud_flags or []), SHARED_CONTENT_FLAG]
+        return True
+    
+    def reused_verification(self, source: Document) -> Dict[str, Any]:
+        """A verify_document-shaped result copied from an earlier document."""
+        return {
+            "valid": bool(source.is_verified),
+            "document_type": source.document_type,
+            "extracted_data": source.extracted_data or {},
+            "confidence_score": float(source.confidence_score),
+            "fraud_flags": source.fraud_flags or [],
+            "reused_from": str(source.id)
+        }
+    
+    def apply_verification(self, document: Document, result: Dict[str, Any]) -> None:
+        """Record a verification result on a document row."""
+        document.is_verified = result["valid"]
+        document.verified_at = datetime.utcnow() if result["valid"] else None
+        document.extracted_data = result.get("extracted_data", {})
+        document.confidence_score = result.get("confidence_score", 0)
+        document.fraud_flags = result.get("fraud_flags", [])
+        document.is_suspicious = len(result.get("fraud_flags", [])) > 0
+        if result.get("reused_from"):
+            document.verification_notes = f"Reused verification of document {result['reused_from']} (identical content)"
     
     async def verify_document(
         self,
@@ -0,0 +1,411 @@
+"""Streaming data exports.
+
+Usage (columnar exports, requires pyarrow):
+    python -m app.services.export_service applications applications.parquet --start-date 2026-01-01
+"""
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+from app.config import settings
+from app.models.conversation import Conversation, Message
+from app.models.loan_application import LoanApplication, Document
+from app.utils.database import SessionLocal
+from app.utils.logger import get_logger
+import argparse
+import csv
+import enum
+import io
+import json
+import uuid
+import zlib
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - slim installs without pyarrow
+    pa = None
+    pq = None
+
+logger = get_logger(__name__)
+
+# Exported application fields -> columns (only these are fetched)
+APPLICATION_COLUMNS = {
+    "application_number": LoanApplication.application_number,
+    "status": LoanApplication.status,
+    "requested_amount": LoanApplication.requested_amount,
+    "approved_amount": LoanApplication.approved_amount,
+    "credit_score": LoanApplication.credit_score,
+    "created_at": LoanApplication.created_at,
+}
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+# Columnar datasets: name -> (range column, {field: (column, arrow type name)})
+COLUMNAR_DATASETS = {
+    "applications": (LoanApplication.created_at, {
+        "id": (LoanApplication.id, "string"),
+        "application_number": (LoanApplication.application_number, "string"),
+        "user_id": (LoanApplication.user_id, "string"),
+        "conversation_id": (LoanApplication.conversation_id, "string"),
+        "status": (LoanApplication.status, "string"),
+        "loan_purpose": (LoanApplication.loan_purpose, "string"),
+        "requested_amount": (LoanApplication.requested_amount, "float64"),
+        "approved_amount": (LoanApplication.approved_amount, "float64"),
+        "tenure_months": (LoanApplication.tenure_months, "int32"),
+        "interest_rate": (LoanApplication.interest_rate, "float64"),
+        "monthly_income": (LoanApplication.monthly_income, "float64"),
+        "credit_score": (LoanApplication.credit_score, "int32"),
+        "risk_score": (LoanApplication.risk_score, "float64"),
+        "risk_category": (LoanApplication.risk_category, "string"),
+        "created_at": (LoanApplication.created_at, "timestamp"),
+        "submitted_at": (LoanApplication.submitted_at, "timestamp"),
+        "approved_at": (LoanApplication.approved_at, "timestamp"),
+        "sanctioned_at": (LoanApplication.sanctioned_at, "timestamp"),
+    }),
+    "conversations": (Conversation.started_at, {
+        "id": (Conversation.id, "string"),
+        "user_id": (Conversation.user_id, "string"),
+        "status": (Conversation.status, "string"),
+        "current_agent": (Conversation.current_agent, "string"),
+        "started_at": (Conversation.started_at, "timestamp"),
+        "ended_at": (Conversation.ended_at, "timestamp"),
+        "last_message_at": (Conversation.last_message_at, "timestamp"),
+        "message_count": (Conversation.message_count, "int32"),
+        "overall_sentiment": (Conversation.overall_sentiment, "string"),
+    }),
+    "messages": (Message.created_at, {
+        "id": (Message.id, "string"),
+        "conversation_id": (Message.conversation_id, "string"),
+        "role": (Message.role, "string"),
+        "agent_type": (Message.agent_type, "string"),
+        "content": (Message.content, "string"),
+        "created_at": (Message.created_at, "timestamp"),
+    }),
+    "documents": (Document.uploaded_at, {
+        "id": (Document.id, "string"),
+        "application_id": (Document.application_id, "string"),
+        "user_id": (Document.user_id, "string"),
+        "document_type": (Document.document_type, "string"),
+        "file_name": (Document.file_name, "string"),
+        "file_size": (Document.file_size, "int64"),
+        "mime_type": (Document.mime_type, "string"),
+        "content_hash": (Document.content_hash, "string"),
+        "is_verified": (Document.is_verified, "bool"),
+        "verified_at": (Document.verified_at, "timestamp"),
+        "confidence_score": (Document.confidence_score, "float64"),
+        "is_suspicious": (Document.is_suspicious, "bool"),
+        "uploaded_at": (Document.uploaded_at, "timestamp"),
+    }),
+}
+
+
+def export_value(value: Any) -> Any:
+    """Convert a column value to a plain CSV/JSON value."""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def columnar_value(value: Any) -> Any:
+    """Convert a column value to one pyarrow accepts (datetimes stay native)."""
+    if isinstance(value, datetime):
+        return value
+    return export_value(value)
+
+
+def arrow_schema(dataset: str) -> "pa.Schema":
+    """Typed Arrow schema for a columnar dataset."""
+    types = {
+        "string": pa.string(),
+        "int32": pa.int32(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us"),
+    }
+    _, fields = COLUMNAR_DATASETS[dataset]
+    return pa.schema([(name, types[type_name]) for name, (_, type_name) in fields.items()])
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose written bytes are collected and drained."""
+    
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+    
+    def writable(self) -> bool:
+        return True
+    
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+    
+    def tell(self) -> int:
+        return self._position
+    
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ExportService:
+    """
+    Stream exports in constant memory.
+    
+    Rows come from a server-side cursor (`yield_per`) in fixed-size
+    batches and are encoded and, optionally, gzipped one batch at a time.
+    Generators open their own session because a StreamingResponse outlives
+    the request's dependencies.
+    """
+    
+    def __init__(self, batch_size: int = None, row_group_size: int = None):
+        """Initialize export service."""
+        self.batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+        self.row_group_size = row_group_size or settings.EXPORT_ROW_GROUP_SIZE
+    
+    @property
+    def columnar_available(self) -> bool:
+        """Whether pyarrow is importable (it is in requirements.txt)."""
+        return pa is not None
+    
+    def iter_application_batches(
+        self,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Iterator[List[Tuple[Any, ...]]]:
+        """Yield application rows (APPLICATION_COLUMNS order) oldest first."""
+        db = SessionLocal()
+        try:
+            query = db.query(*APPLICATION_COLUMNS.values())
+            
+            if start_date:
+                query = query.filter(LoanApplication.created_at >= start_date)
+            
+            if end_date:
+                query = query.filter(LoanApplication.created_at <= end_date)
+            
+            query = query.order_by(
+                LoanApplication.created_at,
+                LoanApplication.id
+            ).yield_per(self.batch_size)
+            
+            batch = []
+            for row in query:
+                batch.append(tuple(export_value(value) for value in row))
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+        finally:
+            db.close()
+    
+    def csv_chunks(
+        self,
+        fields: Iterable[str],
+        batches: Iterable[List[Tuple[Any, ...]]]
+    ) -> Iterator[bytes]:
+        """Encode batches as CSV; the header goes out before the query runs."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        
+        writer.writerow(fields)
+        yield buffer.getvalue().encode()
+        
+        for batch in batches:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(batch)
+            yield buffer.getvalue().encode()
+    
+    def ndjson_chunks(
+        self,
+        fields: Iterable[str],
+        batches: Iterable[List[Tuple[Any, ...]]]
+    ) -> Iterator[bytes]:
+        """Encode batches as newline-delimited JSON objects."""
+        fields = list(fields)
+        for batch in batches:
+            yield "".join(
+                json.dumps(dict(zip(fields, row))) + "\n"
+                for row in batch
+            ).encode()
+    
+    @staticmethod
+    def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Gzip a byte stream on the fly, flushing after every chunk."""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            # A sync flush keeps the download progressing batch by batch
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    
+    def stream_applications(
+        self,
+        format: str = "csv",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        compress: bool = False
+    ) -> Iterator[bytes]:
+        """Stream applications as CSV or NDJSON, optionally gzipped."""
+        encode = self.csv_chunks if format == "csv" else self.ndjson_chunks
+        chunks = encode(APPLICATION_COLUMNS, self._logged(
+            "applications", self.iter_application_batches(start_date, end_date)
+        ))
+        return self.gzip_chunks(chunks) if compress else chunks
+    
+    def _logged(
+        self,
+        name: str,
+        batches: Iterator[List[Tuple[Any, ...]]]
+    ) -> Iterator[List[Tuple[Any, ...]]]:
+        """Pass batches through, logging the outcome (errors cannot become 500s mid-stream)."""
+        rows = 0
+        try:
+            for batch in batches:
+                rows += len(batch)
+                yield batch
+        except Exception as e:
+            logger.error("export_error", export=name, rows=rows, error=str(e))
+            raise
+        logger.info("export_completed", export=name, rows=rows)
+    
+    def iter_record_batches(
+        self,
+        dataset: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Iterator["pa.RecordBatch"]:
+        """
+        Yield typed record batches of up to `row_group_size` rows.
+        
+        Rows are streamed in table order (no ORDER BY, so no sort on the
+        server); only one row group is held in memory at a time.
+        """
+        range_column, fields = COLUMNAR_DATASETS[dataset]
+        schema = arrow_schema(dataset)
+        
+        db = SessionLocal()
+        try:
+            query = db.query(*(column for column, _ in fields.values()))
+            
+            if start_date:
+                query = query.filter(range_column >= start_date)
+            
+            if end_date:
+                query = query.filter(range_column <= end_date)
+            
+            rows = []
+            for row in query.yield_per(self.batch_size):
+                rows.append(row)
+                if len(rows) >= self.row_group_size:
+                    yield self._record_batch(schema, rows)
+                    rows = []
+            if rows:
+                yield self._record_batch(schema, rows)
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _record_batch(schema: "pa.Schema", rows: List[Tuple[Any, ...]]) -> "pa.RecordBatch":
+        """Build one typed record batch from row tuples."""
+        return pa.RecordBatch.from_arrays(
+            [
+                pa.array([columnar_value(value) for value in values], type=field.type)
+                for values, field in zip(zip(*rows), schema)
+            ],
+            schema=schema
+        )
+    
+    def write_columnar(
+        self,
+        sink: Any,
+        dataset: str,
+        format: str = "parquet",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Iterator[int]:
+        """
+        Write a dataset as Parquet or an Arrow IPC file to `sink`.
+        
+        Each record batch becomes one Parquet row group / IPC batch, written
+        as soon as it is read. Yields the running row count after each batch
+        so callers can hand finished bytes on.
+        """
+        if pa is None:
+            raise RuntimeError("pyarrow is not installed")
+        
+        schema = arrow_schema(dataset)
+        if format == "parquet":
+            writer = pq.ParquetWriter(sink, schema, compression="zstd")
+        else:
+            writer = pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+        
+        rows = 0
+        try:
+            for batch in self.iter_record_batches(dataset, start_date, end_date):
+                writer.write_batch(batch)
+                rows += batch.num_rows
+                yield rows
+        finally:
+            writer.close()
+        logger.info("export_completed", export=dataset, format=format, rows=rows)
+    
+    def stream_columnar(
+        self,
+        dataset: str,
+        format: str = "parquet",
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> Iterator[bytes]:
+        """Stream a Parquet/Arrow export, yielding bytes after every row group."""
+        sink = _ChunkSink()
+        try:
+            for _ in self.write_columnar(pa.PythonFile(sink, mode="w"), dataset, format, start_date, end_date):
+                data = sink.drain()
+                if data:
+                    yield data
+        except Exception as e:
+            logger.error("export_error", export=dataset, format=format, error=str(e))
+            raise
+        yield sink.drain()
+
+
+# Global export service instance
+export_service = ExportService()
+
+
+def main() -> None:
+    """Command line entry point for columnar exports."""
+    parser = argparse.ArgumentParser(description="Export data as Parquet or Arrow")
+    parser.add_argument("dataset", choices=sorted(COLUMNAR_DATASETS))
+    parser.add_argument("output", help="destination file path")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--start-date", type=datetime.fromisoformat)
+    parser.add_argument("--end-date", type=datetime.fromisoformat)
+    args = parser.parse_args()
+    
+    rows = 0
+    for rows in export_service.write_columnar(
+        args.output, args.dataset, args.format, args.start_date, args.end_date
+    ):
+        pass
+    print(f"exported {rows} {args.dataset} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
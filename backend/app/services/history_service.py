@@ -0,0 +1,235 @@
+"""Conversation transcripts with sequence cursors and change notifications."""
+from typing import Dict, List, Optional, Set, Tuple
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+from app.utils.cache import cache
+from app.utils.database import get_mongo_db
+from app.utils.executors import run_in_thread
+from app.utils.logger import get_logger
+import asyncio
+import json
+import threading
+
+logger = get_logger(__name__)
+
+# Redis channel carrying {"conversation_id", "last_seq"} after every append
+HISTORY_CHANNEL = "chat:history"
+
+
+class HistoryService:
+    """
+    Conversation transcripts in the MongoDB `conversation_history` collection.
+    
+    Every stored message carries a 1-based `seq` and each document keeps
+    `last_seq`, so clients can ask for only the messages after a cursor.
+    Appends publish the new `last_seq` on HISTORY_CHANNEL; a listener
+    thread relays it to long-polls waiting in this process, so a write on
+    any worker wakes readers on every worker. Without Redis, waiters in the
+    writing process are still woken directly.
+    
+    Appends number and store messages in one update, so a reader never
+    sees a `last_seq` whose messages are not there yet.
+    """
+    
+    def __init__(self, channel: str = HISTORY_CHANNEL):
+        """Initialize history service."""
+        self.channel = channel
+        self._waiters: Dict[str, Set[asyncio.Future]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+    
+    @property
+    def collection(self):
+        """The MongoDB transcript collection."""
+        return get_mongo_db()["conversation_history"]
+    
+    def ensure_indexes(self) -> None:
+        """Create the unique transcript index (called at startup)."""
+        # Unique so racing first appends cannot create two transcripts
+        self.collection.create_index(
+            [("conversation_id", ASCENDING)],
+            name="conversation_id_unique",
+            unique=True
+        )
+    
+    def get_recent(self, conversation_id: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Last `limit` messages as plain role/content pairs (agent context)."""
+        doc = self.collection.find_one(
+            {"conversation_id": conversation_id},
+            {"_id": 0, "messages": {"$slice": -limit}}
+        )
+        messages = doc.get("messages", []) if doc else []
+        return [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+    
+    def get_messages(self, conversation_id: str, since: int = 0) -> Tuple[List[dict], int]:
+        """Messages with `seq > since`, and the transcript's `last_seq`."""
+        if since > 0:
+            # Filter server-side so only the new tail crosses the wire
+            docs = list(self.collection.aggregate([
+                {"$match": {"conversation_id": conversation_id}},
+                {"$project": {
+                    "_id": 0,
+                    "last_seq": 1,
+                    "messages": {"$filter": {
+                        "input": {"$ifNull": ["$messages", []]},
+                        "cond": {"$gt": ["$$this.seq", since]}
+                    }}
+                }}
+            ]))
+            doc = docs[0] if docs else None
+        else:
+            doc = self.collection.find_one({"conversation_id": conversation_id}, {"_id": 0})
+        
+        if not doc:
+            return [], 0
+        
+        messages = doc.get("messages", [])
+        if "last_seq" not in doc:
+            # Transcript written before sequencing: seq is the position
+            for seq, msg in enumerate(messages, 1):
+                msg.setdefault("seq", seq)
+            return messages, len(messages)
+        return messages, doc["last_seq"]
+    
+    def last_seq(self, conversation_id: str) -> int:
+        """Sequence number of the newest stored message (0 if none)."""
+        docs = list(self.collection.aggregate([
+            {"$match": {"conversation_id": conversation_id}},
+            {"$project": {"_id": 0, "last_seq": 1, "count": {"$size": {"$ifNull": ["$messages", []]}}}}
+        ]))
+        doc = docs[0] if docs else None
+        if not doc:
+            return 0
+        return doc.get("last_seq", doc.get("count", 0))
+    
+    def append(self, conversation_id: str, messages: List[dict]) -> int:
+        """Number and append messages; returns the new `last_seq`."""
+        last_seq = self._append_sequenced(conversation_id, messages)
+        if last_seq is None:
+            self._sequence_legacy(conversation_id)
+            last_seq = self._append_sequenced(conversation_id, messages)
+        return last_seq
+    
+    def _append_sequenced(self, conversation_id: str, messages: List[dict]) -> Optional[int]:
+        """
+        Number and push messages onto a sequenced transcript in one update.
+        
+        The update only applies if `last_seq` is still the value the numbers
+        were based on (compare-and-set); a concurrent append makes it retry.
+        Returns None if the transcript is missing or not sequenced yet.
+        """
+        while True:
+            doc = self.collection.find_one(
+                {"conversation_id": conversation_id, "last_seq": {"$exists": True}},
+                {"_id": 0, "last_seq": 1}
+            )
+            if doc is None:
+                return None
+            
+            current = doc["last_seq"]
+            result = self.collection.update_one(
+                {"conversation_id": conversation_id, "last_seq": current},
+                {
+                    "$push": {"messages": {
+                        "$each": [{**msg, "seq": current + i} for i, msg in enumerate(messages, 1)]
+                    }},
+                    "$set": {"last_seq": current + len(messages)},
+                    "$currentDate": {"updated_at": True}
+                }
+            )
+            if result.modified_count:
+                return current + len(messages)
+    
+    def _sequence_legacy(self, conversation_id: str) -> None:
+        """Create the transcript, or number one written before sequencing."""
+        doc = self.collection.find_one({"conversation_id": conversation_id}, {"_id": 0, "messages": 1})
+        messages = doc.get("messages", []) if doc else []
+        try:
+            self.collection.update_one(
+                {"conversation_id": conversation_id, "last_seq": {"$exists": False}},
+                {"$set": {
+                    "messages": [{**msg, "seq": seq} for seq, msg in enumerate(messages, 1)],
+                    "last_seq": len(messages)
+                }},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A concurrent append sequenced it first; the unique index stopped the duplicate
+            pass
+    
+    def notify(self, conversation_id: str, last_seq: int) -> None:
+        """Wake long-polls for a conversation, here and on other workers."""
+        self._wake(conversation_id)
+        try:
+            cache.redis_client.publish(
+                self.channel,
+                json.dumps({"conversation_id": conversation_id, "last_seq": last_seq})
+            )
+        except Exception as e:
+            logger.error("history_notify_error", conversation_id=conversation_id, error=str(e))
+    
+    async def wait_for(self, conversation_id: str, since: int, timeout: float) -> bool:
+        """Wait until the transcript grows past `since`; False on timeout."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(conversation_id, set()).add(future)
+        try:
+            # Checked after registering so an append in between is not missed
+            if await run_in_thread(self.last_seq, conversation_id) > since:
+                return True
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            waiters = self._waiters.get(conversation_id)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[conversation_id]
+    
+    def _wake(self, conversation_id: str) -> None:
+        """Resolve every waiter on a conversation (event loop thread only)."""
+        for future in self._waiters.get(conversation_id, ()):
+            if not future.done():
+                future.set_result(True)
+    
+    def start(self) -> None:
+        """Start relaying Redis notifications to local waiters (called from lifespan)."""
+        if self._listener is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stopped.clear()
+        self._listener = threading.Thread(target=self._listen, name="history-listener", daemon=True)
+        self._listener.start()
+        logger.info("history_listener_started", channel=self.channel)
+    
+    def stop(self) -> None:
+        """Stop the notification listener."""
+        if self._listener is None:
+            return
+        self._stopped.set()
+        self._listener.join(timeout=5)
+        self._listener = None
+    
+    def _listen(self) -> None:
+        """Listener thread: subscribe, relay, and resubscribe after Redis errors."""
+        while not self._stopped.is_set():
+            pubsub = cache.redis_client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                while not self._stopped.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is None:
+                        continue
+                    conversation_id = json.loads(message["data"])["conversation_id"]
+                    self._loop.call_soon_threadsafe(self._wake, conversation_id)
+            except Exception as e:
+                logger.error("history_listener_error", error=str(e))
+                self._stopped.wait(5)
+            finally:
+                pubsub.close()
+
+
+# Global history service instance
+history_service = HistoryService()
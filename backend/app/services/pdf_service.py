@@ -9,6 +9,7 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from app.config import settings
+from app.utils.executors import run_in_process
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -23,7 +24,11 @@ class PDFService:
         os.makedirs(self.output_dir, exist_ok=True)
     
     async def generate_sanction_letter(self, data: Dict[str, Any]) -> str:
-        """Generate loan sanction letter PDF."""
+        """Generate loan sanction letter PDF off the event loop."""
+        return await run_in_process(self.render_sanction_letter, data)
+    
+    def render_sanction_letter(self, data: Dict[str, Any]) -> str:
+        """Render loan sanction letter PDF (blocking, CPU-bound)."""
         try:
             # Generate filename
             filename = f"sanction_letter_{data['application_number']}.pdf"
@@ -1,12 +1,18 @@
 """Customer profiling service for personalization."""
 from typing import Dict, Any, Optional
+from sqlalchemy import Text, cast, func, literal
+from sqlalchemy.dialects.postgresql import JSONB, array, insert as pg_insert
 from sqlalchemy.orm import Session
 from datetime import datetime
+import uuid
 from app.models.customer_profile import CustomerProfile
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Number of recent sentiment readings kept per profile
+SENTIMENT_HISTORY_SIZE = 50
+
 
 class ProfilingService:
     """Service for customer profiling and personalization."""
@@ -36,6 +42,33 @@ class ProfilingService:
             db.rollback()
             raise
     
+    def _increment(
+        self,
+        user_id: str,
+        db: Session,
+        values: Dict[str, Any]
+    ) -> None:
+        """
+        Apply an atomic UPDATE to a user's profile, creating it if missing.
+        
+        Values are SQL expressions evaluated against the current row, so
+        concurrent turns never lose each other's increments.
+        """
+        def update() -> int:
+            return db.query(CustomerProfile).filter(
+                CustomerProfile.user_id == user_id
+            ).update(values, synchronize_session=False)
+        
+        if update() == 0:
+            db.execute(
+                pg_insert(CustomerProfile)
+                .values(id=uuid.uuid4(), user_id=user_id)
+                .on_conflict_do_nothing(index_elements=["user_id"])
+            )
+            update()
+        
+        db.commit()
+    
     async def update_engagement_metrics(
         self,
         user_id: str,
@@ -44,28 +77,31 @@ class ProfilingService:
     ) -> None:
         """Update engagement metrics for user."""
         try:
-            profile = await self.get_or_create_profile(user_id, db)
+            now = datetime.utcnow()
+            values = {
+                CustomerProfile.last_engagement_at: now,
+                CustomerProfile.total_conversations: CustomerProfile.total_conversations + 1,
+            }
             
-            # Update engagement
-            profile.last_engagement_at = datetime.utcnow()
-            profile.total_conversations += 1
-            
-            # Update sentiment history
             if sentiment_score is not None:
-                sentiment_history = profile.sentiment_history or []
-                sentiment_history.append({
-                    "score": sentiment_score,
-                    "timestamp": datetime.utcnow().isoformat()
-                })
+                count = CustomerProfile.sentiment_count
+                total = CustomerProfile.sentiment_sum + sentiment_score
+                entry = {"score": sentiment_score, "timestamp": now.isoformat()}
                 
-                # Keep last 50 records
-                profile.sentiment_history = sentiment_history[-50:]
-                
-                # Calculate average
-                scores = [s["score"] for s in sentiment_history]
-                profile.average_sentiment_score = sum(scores) / len(scores)
+                # Running mean from count/sum; history is a fixed-size ring buffer
+                values.update({
+                    CustomerProfile.sentiment_count: count + 1,
+                    CustomerProfile.sentiment_sum: total,
+                    CustomerProfile.average_sentiment_score: total / (count + 1),
+                    CustomerProfile.sentiment_history: func.jsonb_set(
+                        func.coalesce(CustomerProfile.sentiment_history, cast("[]", JSONB)),
+                        array([cast(count % SENTIMENT_HISTORY_SIZE, Text)]),
+                        literal(entry, JSONB),
+                        True
+                    ),
+                })
             
-            db.commit()
+            self._increment(user_id, db, values)
             
         except Exception as e:
             logger.error("engagement_update_error", error=str(e))
@@ -79,13 +115,13 @@ class ProfilingService:
     ) -> None:
         """Update application metrics."""
         try:
-            profile = await self.get_or_create_profile(user_id, db)
-            
-            profile.total_applications += 1
+            values = {
+                CustomerProfile.total_applications: CustomerProfile.total_applications + 1,
+            }
             if application_successful:
-                profile.successful_applications += 1
+                values[CustomerProfile.successful_applications] = CustomerProfile.successful_applications + 1
             
-            db.commit()
+            self._increment(user_id, db, values)
             
         except Exception as e:
             logger.error("application_metrics_error", error=str(e))
@@ -0,0 +1,401 @@
+"""Daily analytics rollups into ConversionMetric and AgentPerformance.
+
+Usage:
+    python -m app.services.rollup_service
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models.conversation import Conversation, ConversationStatus
+from app.models.loan_application import LoanApplication
+from app.models.metrics import ConversionMetric, AgentPerformance
+from app.services.analytics_service import analytics_service, FUNNEL_COUNTS
+from app.utils.cache import cache
+from app.utils.database import SessionLocal
+from app.utils.executors import run_in_thread
+from app.utils.logger import get_logger
+import asyncio
+import time
+
+logger = get_logger(__name__)
+
+# Funnel count -> ConversionMetric column
+FUNNEL_COLUMNS = {
+    field: "applications_approved" if field == "approved" else field
+    for field in FUNNEL_COUNTS
+}
+
+# Funnel conversion rate -> ConversionMetric column
+RATE_COLUMNS = {
+    "qualification_rate": "qualification_rate",
+    "document_submission_rate": "document_submission_rate",
+    "approval_rate": "approval_rate",
+    "overall_conversion": "overall_conversion_rate",
+}
+
+# Largest value a Numeric(5, 2) rate column holds
+MAX_RATE = 999.99
+
+DASHBOARD_CACHE_KEY = "analytics:dashboard"
+DASHBOARD_REFRESH_LOCK = "analytics:dashboard:refresh"
+ROLLUP_LOCK = "analytics:rollup"
+
+
+def day_bounds(day: date) -> Tuple[datetime, datetime]:
+    """First and last instant of a UTC day (analytics ranges are inclusive)."""
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=1) - timedelta(microseconds=1)
+
+
+def _with_session(func: Callable[..., Any], *args: Any) -> Any:
+    """Call `func(db, *args)` on a session of its own (runs in a worker thread)."""
+    db = SessionLocal()
+    try:
+        return func(db, *args)
+    finally:
+        db.close()
+
+
+class RollupService:
+    """
+    Materialize daily analytics into ConversionMetric and AgentPerformance.
+    
+    A day's rollup is computed with the same AnalyticsService queries the
+    live endpoints use, bounded to that day, and upserted on its date. Each
+    run fills in closed days that have no rollup yet, re-aggregates the last
+    ROLLUP_RESTATE_DAYS closed days (applications keep moving through the
+    funnel after the day they were created) and refreshes the open day.
+    Only one worker runs the job per interval (Redis lock). The dashboard
+    reads month-to-date closed days from rollups and only today from raw
+    rows; all-time totals stay live counts, since they would otherwise
+    drift once days leave the restatement window.
+    """
+    
+    def __init__(
+        self,
+        interval: int = None,
+        restate_days: int = None,
+        cache_ttl: int = None,
+        cache_stale: int = None
+    ):
+        """Initialize rollup service."""
+        self.interval = interval or settings.ROLLUP_INTERVAL
+        self.restate_days = settings.ROLLUP_RESTATE_DAYS if restate_days is None else restate_days
+        self.cache_ttl = cache_ttl or settings.DASHBOARD_CACHE_TTL
+        self.cache_stale = cache_stale or settings.DASHBOARD_CACHE_STALE
+        self._task: Optional[asyncio.Task] = None
+        self._refresh: Optional[asyncio.Future] = None
+    
+    @property
+    def running(self) -> bool:
+        """Whether the background rollup task is active."""
+        return self._task is not None and not self._task.done()
+    
+    def start(self) -> None:
+        """Start the periodic rollup task (called from lifespan)."""
+        if not self.running:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+            logger.info("rollup_started", interval=self.interval)
+    
+    async def stop(self) -> None:
+        """Stop the periodic rollup task."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _run(self) -> None:
+        """Roll up every `interval` seconds until cancelled (one worker per interval)."""
+        while True:
+            try:
+                if self._claim_run():
+                    await run_in_thread(self.run_once)
+            except Exception as e:
+                logger.error("rollup_loop_error", error=str(e))
+            await asyncio.sleep(self.interval)
+    
+    def _claim_run(self) -> bool:
+        """Claim this interval's run across all workers (best effort Redis lock)."""
+        try:
+            # Left to expire rather than released, so other workers skip the interval
+            return bool(cache.redis_client.set(ROLLUP_LOCK, "1", nx=True, ex=self.interval))
+        except Exception as e:
+            logger.error("rollup_lock_error", error=str(e))
+            return True
+    
+    def run_once(self) -> int:
+        """Roll up missing days, the restatement window and today."""
+        db = SessionLocal()
+        try:
+            today = datetime.utcnow().date()
+            first_day = self._first_day(db)
+            if first_day is None:
+                return 0
+            
+            restate_from = max(first_day, today - timedelta(days=self.restate_days))
+            days = set(self._missing_days(db, first_day, today))
+            days.update(
+                restate_from + timedelta(days=offset)
+                for offset in range((today - restate_from).days + 1)
+            )
+            
+            for day in sorted(days):
+                self.rollup_day(db, day)
+            
+            logger.info("rollup_completed", days=len(days))
+            return len(days)
+        
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+    
+    def _first_day(self, db: Session) -> Optional[date]:
+        """Earliest day with any conversation or application."""
+        firsts = [
+            db.query(func.min(Conversation.started_at)).scalar(),
+            db.query(func.min(LoanApplication.created_at)).scalar()
+        ]
+        firsts = [ts for ts in firsts if ts is not None]
+        return min(firsts).date() if firsts else None
+    
+    def _missing_days(self, db: Session, first_day: date, today: date) -> List[date]:
+        """Closed days from `first_day` up to yesterday without a rollup row."""
+        start, _ = day_bounds(first_day)
+        rolled_up = {
+            row_date.date()
+            for (row_date,) in db.query(ConversionMetric.date).filter(ConversionMetric.date >= start)
+        }
+        return [
+            first_day + timedelta(days=offset)
+            for offset in range((today - first_day).days)
+            if first_day + timedelta(days=offset) not in rolled_up
+        ]
+    
+    def rollup_day(self, db: Session, day: date) -> None:
+        """Aggregate one day and upsert its ConversionMetric/AgentPerformance rows."""
+        start, end = day_bounds(day)
+        
+        funnel = analytics_service.get_conversion_funnel(db, start, end)
+        agents = analytics_service.get_agent_performance(db, start, end)
+        times = analytics_service.get_time_metrics(db, start, end)
+        if not (funnel and agents and times):
+            # The analytics queries log and return {} on failure
+            raise RuntimeError(f"analytics queries failed for {day.isoformat()}")
+        
+        values = {column: funnel[field] for field, column in FUNNEL_COLUMNS.items()}
+        values.update({
+            column: min(round(funnel["conversion_rates"][field], 2), MAX_RATE)
+            for field, column in RATE_COLUMNS.items()
+        })
+        values["avg_time_to_sanction"] = (
+            times["avg_time_to_sanction_minutes"] if times["sanctioned_count"] else None
+        )
+        values["agent_performance"] = agents
+        
+        db.execute(
+            pg_insert(ConversionMetric).values(date=start, **values).on_conflict_do_update(
+                index_elements=[ConversionMetric.date],
+                set_=values
+            )
+        )
+        
+        for agent, stats in agents.items():
+            agent_values = {
+                "total_interactions": stats["interactions"],
+                "successful_handoffs": stats["handoffs"],
+                "failed_handoffs": stats["by_status"].get(ConversationStatus.ABANDONED.value, 0),
+                "metrics_data": {
+                    "by_status": stats["by_status"],
+                    "turns": stats["turns"],
+                    "handoffs_in": stats["handoffs_in"],
+                    "avg_handoff_latency_seconds": stats["avg_handoff_latency_seconds"]
+                }
+            }
+            db.execute(
+                pg_insert(AgentPerformance).values(
+                    agent_type=agent, date=start, **agent_values
+                ).on_conflict_do_update(
+                    index_elements=[AgentPerformance.agent_type, AgentPerformance.date],
+                    set_=agent_values
+                )
+            )
+        
+        db.commit()
+    
+    def _funnel_totals(self, db: Session, start: datetime, end: datetime) -> Dict[str, int]:
+        """Sum rolled-up funnel counts for days in [start, end)."""
+        sums = db.query(*(
+            func.coalesce(func.sum(getattr(ConversionMetric, column)), 0)
+            for column in FUNNEL_COLUMNS.values()
+        )).filter(
+            ConversionMetric.date >= start,
+            ConversionMetric.date < end
+        ).one()
+        return {field: int(total) for field, total in zip(FUNNEL_COLUMNS, sums)}
+    
+    def _agent_totals(self, db: Session, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+        """Rolled-up agent stats for days in [start, end), one entry per agent-day."""
+        rows = db.query(AgentPerformance).filter(
+            AgentPerformance.date >= start,
+            AgentPerformance.date < end
+        ).all()
+        return [
+            {
+                "agent": row.agent_type,
+                "interactions": row.total_interactions,
+                "handoffs": row.successful_handoffs,
+                **(row.metrics_data or {})
+            }
+            for row in rows
+        ]
+    
+    @staticmethod
+    def _merge_agents(entries: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Combine per-day agent stats; handoff latency is weighted by handoffs."""
+        merged = analytics_service.empty_agent_stats()
+        latency_totals = {agent: 0.0 for agent in merged}
+        
+        for entry in entries:
+            stats = merged.get(entry["agent"])
+            if stats is None:
+                continue
+            stats["interactions"] += entry["interactions"]
+            stats["handoffs"] += entry["handoffs"]
+            stats["turns"] += entry.get("turns", 0)
+            for conv_status, count in entry.get("by_status", {}).items():
+                stats["by_status"][conv_status] = stats["by_status"].get(conv_status, 0) + count
+            
+            handoffs_in = entry.get("handoffs_in", 0)
+            stats["handoffs_in"] += handoffs_in
+            if entry.get("avg_handoff_latency_seconds") is not None:
+                latency_totals[entry["agent"]] += entry["avg_handoff_latency_seconds"] * handoffs_in
+        
+        for agent, stats in merged.items():
+            if stats["handoffs_in"]:
+                stats["avg_handoff_latency_seconds"] = latency_totals[agent] / stats["handoffs_in"]
+        
+        return merged
+    
+    async def get_dashboard(self) -> Dict[str, Any]:
+        """
+        Month-to-date dashboard: closed days from rollups, today from raw rows.
+        
+        Rollups are only written by the background job; the overview's
+        all-time totals are live counts (one scan per table). The
+        aggregates are independent and run concurrently, each on its own
+        pooled connection.
+        """
+        now = datetime.utcnow()
+        today_start, _ = day_bounds(now.date())
+        start_of_month = datetime(now.year, now.month, 1)
+        
+        (
+            today_funnel,
+            today_agents,
+            month_counts,
+            month_agents,
+            time_metrics,
+            overview
+        ) = await asyncio.gather(
+            # Today's partial day
+            run_in_thread(_with_session, analytics_service.get_conversion_funnel, today_start, now),
+            run_in_thread(_with_session, analytics_service.get_agent_performance, today_start, now),
+            # Month to date
+            run_in_thread(_with_session, self._funnel_totals, start_of_month, today_start),
+            run_in_thread(_with_session, self._agent_totals, start_of_month, today_start),
+            # Percentiles do not add up across days, so time metrics stay on
+            # the single created_at range query; its stages span unsanctioned
+            # applications too, so this is a range scan of
+            # ix_loan_applications_created_at_id, not the sanctioned partial index
+            run_in_thread(_with_session, analytics_service.get_time_metrics, start_of_month, now),
+            # All time, live
+            run_in_thread(_with_session, analytics_service.get_dashboard_stats)
+        )
+        if not overview:
+            # The analytics queries log and return {} on failure
+            raise RuntimeError("dashboard overview query failed")
+        
+        funnel = analytics_service.build_funnel({
+            field: month_counts[field] + today_funnel.get(field, 0)
+            for field in FUNNEL_COUNTS
+        })
+        agent_perf = self._merge_agents(month_agents + [
+            {"agent": agent, **stats} for agent, stats in today_agents.items()
+        ])
+        
+        return {
+            "period": {
+                "start": start_of_month.isoformat(),
+                "end": now.isoformat()
+            },
+            "overview": overview,
+            "conversion_funnel": funnel,
+            "agent_performance": agent_perf,
+            "time_metrics": time_metrics
+        }
+    
+    async def get_cached_dashboard(self) -> Dict[str, Any]:
+        """
+        Dashboard payload shared through Redis.
+        
+        Payloads younger than DASHBOARD_CACHE_TTL are served as is. Older
+        ones (kept up to DASHBOARD_CACHE_STALE more seconds) are still
+        served while a single background refresh replaces them, so only a
+        cold cache makes a caller wait; concurrent callers in a process then
+        share one computation.
+        """
+        cached = cache.get(DASHBOARD_CACHE_KEY)
+        if cached is not None:
+            if time.time() - cached["cached_at"] >= self.cache_ttl:
+                self._refresh_in_background()
+            return cached["payload"]
+        
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.ensure_future(self._compute_and_cache())
+        return await asyncio.shield(self._refresh)
+    
+    def _refresh_in_background(self) -> None:
+        """Start one refresh across all workers (best effort Redis lock)."""
+        if self._refresh is not None and not self._refresh.done():
+            return
+        try:
+            acquired = cache.redis_client.set(DASHBOARD_REFRESH_LOCK, "1", nx=True, ex=self.cache_ttl)
+        except Exception as e:
+            logger.error("dashboard_refresh_lock_error", error=str(e))
+            acquired = True
+        if acquired:
+            self._refresh = asyncio.ensure_future(self._compute_and_cache())
+            self._refresh.add_done_callback(self._log_refresh_error)
+    
+    @staticmethod
+    def _log_refresh_error(future: asyncio.Future) -> None:
+        """Log failures of background refreshes nobody awaits."""
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("dashboard_refresh_error", error=str(future.exception()))
+    
+    async def _compute_and_cache(self) -> Dict[str, Any]:
+        """Build the dashboard and store it with its timestamp."""
+        payload = await self.get_dashboard()
+        cache.set(
+            DASHBOARD_CACHE_KEY,
+            {"cached_at": time.time(), "payload": payload},
+            ttl=self.cache_ttl + self.cache_stale
+        )
+        return payload
+
+
+# Global rollup service instance
+rollup_service = RollupService()
+
+
+if __name__ == "__main__":
+    days = rollup_service.run_once()
+    print(f"rolled up {days} day(s)")
@@ -1,12 +1,251 @@
 """Audit logging utilities."""
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Iterator, List, Optional
+from fastapi import Request
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import BulkWriteError, OperationFailure
+from app.config import settings
 from app.utils.database import get_mongo_db
+from app.utils.executors import run_in_thread
+from app.utils.pagination import encode_cursor, decode_cursor
 from app.utils.logger import get_logger
+import asyncio
+import glob
+import itertools
+import json
+import os
+import threading
 import uuid
 
 logger = get_logger(__name__)
 
+DUPLICATE_KEY_ERROR = 11000
+
+
+class AuditLogWriter:
+    """
+    Buffered audit writer.
+    
+    Events are appended to an in-memory buffer and written with
+    `insert_many` by a background task once AUDIT_BATCH_SIZE events are
+    queued or AUDIT_FLUSH_INTERVAL seconds pass. Batches that cannot reach
+    Mongo, and events arriving while the buffer is full, are appended to a
+    spill file on disk and replayed on the next successful flush. Replays
+    are idempotent because every entry carries its own `_id`.
+    """
+    
+    def __init__(
+        self,
+        collection_name: str,
+        batch_size: int = None,
+        flush_interval: float = None,
+        max_buffer: int = None,
+        spill_dir: str = None
+    ):
+        """Initialize audit writer."""
+        self.collection_name = collection_name
+        self.batch_size = batch_size or settings.AUDIT_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.AUDIT_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or settings.AUDIT_MAX_BUFFER
+        self.spill_dir = spill_dir or settings.AUDIT_SPILL_DIR
+        self.spill_path = os.path.join(self.spill_dir, f"audit_spill_{os.getpid()}.jsonl")
+        
+        self._buffer: deque = deque()
+        self._overflow: List[Dict[str, Any]] = []
+        self._spill_lock = threading.Lock()
+        self._replay_lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        
+        self._replay_pending = False
+        self.spilled_events = 0
+    
+    @property
+    def running(self) -> bool:
+        """Whether the background flush task is active."""
+        return self._task is not None and not self._task.done()
+    
+    def start(self) -> None:
+        """Start the background flush task (called from lifespan)."""
+        if self.running:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = self._loop.create_task(self._run())
+        
+        # Pick up events spilled by a previous process that never replayed them
+        self._replay_pending = bool(self._spill_files())
+        logger.info("audit_writer_started", batch_size=self.batch_size)
+    
+    async def stop(self) -> None:
+        """Stop the background task and flush everything still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        
+        while self._buffer:
+            await self.flush()
+        if self._overflow:
+            await self._spill_overflow()
+        logger.info("audit_writer_stopped", spilled_events=self.spilled_events)
+    
+    def enqueue(self, entry: Dict[str, Any]) -> None:
+        """Queue an entry; overflow goes to the spill file from a worker thread."""
+        if len(self._buffer) >= self.max_buffer:
+            self._overflow.append(entry)
+            # One spill job per burst; later entries ride along with it
+            if len(self._overflow) == 1:
+                asyncio.run_coroutine_threadsafe(self._spill_overflow(), self._loop)
+            return
+        
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.batch_size and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+    
+    async def _spill_overflow(self) -> None:
+        """Spill entries that found the buffer full, keeping fsync off the event loop."""
+        entries, self._overflow = self._overflow, []
+        try:
+            await run_in_thread(self._spill, entries)
+        except Exception as e:
+            logger.error("audit_spill_error", error=str(e), events=len(entries))
+    
+    async def _run(self) -> None:
+        """Flush on size threshold or interval until cancelled."""
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("audit_flush_loop_error", error=str(e))
+    
+    async def flush(self) -> int:
+        """Write up to one batch to Mongo, spilling it to disk on failure."""
+        batch = []
+        while self._buffer and len(batch) < self.batch_size:
+            batch.append(self._buffer.popleft())
+        
+        if not batch:
+            return 0
+        
+        try:
+            await run_in_thread(self._insert_many, batch)
+        except Exception as e:
+            logger.error("audit_flush_error", error=str(e), events=len(batch))
+            await run_in_thread(self._spill, batch)
+            return 0
+        
+        if self._replay_pending:
+            try:
+                await run_in_thread(self._replay_spill)
+            except Exception as e:
+                logger.error("audit_replay_error", error=str(e))
+        
+        return len(batch)
+    
+    def _insert_many(self, entries: List[Dict[str, Any]]) -> None:
+        """Insert entries, ignoring ones that were already written."""
+        collection = get_mongo_db()[self.collection_name]
+        try:
+            collection.insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != DUPLICATE_KEY_ERROR for err in errors):
+                raise
+    
+    def _spill(self, entries: List[Dict[str, Any]]) -> None:
+        """Append entries to the on-disk spill file."""
+        with self._spill_lock:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(self.spill_path, "a", encoding="utf-8") as f:
+                for entry in entries:
+                    record = dict(entry, timestamp=entry["timestamp"].isoformat())
+                    f.write(json.dumps(record, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self.spilled_events += len(entries)
+            self._replay_pending = True
+        logger.warning("audit_events_spilled", events=len(entries))
+    
+    def _spill_files(self) -> List[str]:
+        """Spill files owned by this process or left behind by dead ones."""
+        paths = []
+        for path in glob.glob(os.path.join(self.spill_dir, "audit_spill_*.jsonl*")):
+            pid = os.path.basename(path).split("_")[2].split(".")[0]
+            if int(pid) == os.getpid() or not _pid_alive(int(pid)):
+                paths.append(path)
+        return paths
+    
+    def _replay_spill(self) -> None:
+        """
+        Re-insert spilled entries once Mongo is reachable again.
+        
+        Each spill file is first renamed to a unique `.replaying` name, so
+        new spills start a fresh file and a replay left unfinished by an
+        earlier failure is never overwritten; such leftovers are replayed
+        as they are. The spill lock is only held for the renames.
+        """
+        if not self._replay_lock.acquire(blocking=False):
+            return  # Another replay is already running
+        try:
+            with self._spill_lock:
+                self._replay_pending = False
+                paths = []
+                for path in sorted(self._spill_files(), key=lambda p: not p.endswith(".replaying")):
+                    if not path.endswith(".replaying"):
+                        replaying = f"{path}.{uuid.uuid4().hex}.replaying"
+                        os.replace(path, replaying)
+                        path = replaying
+                    paths.append(path)
+            
+            try:
+                for path in paths:
+                    self._replay_file(path)
+            except Exception:
+                self._replay_pending = True
+                raise
+        finally:
+            self._replay_lock.release()
+    
+    def _replay_file(self, path: str) -> None:
+        """Insert one renamed spill file's entries, then delete it."""
+        entries = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+                    entries.append(record)
+        
+        for i in range(0, len(entries), self.batch_size):
+            self._insert_many(entries[i:i + self.batch_size])
+        
+        os.remove(path)
+        logger.info("audit_spill_replayed", events=len(entries))
+
+
+def _pid_alive(pid: int) -> bool:
+    """Check whether a process id is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
 
 class AuditLogger:
     """Audit logger for compliance."""
@@ -14,6 +253,7 @@ class AuditLogger:
     def __init__(self):
         """Initialize audit logger."""
         self.collection_name = "audit_logs"
+        self.writer = AuditLogWriter(self.collection_name)
     
     def log_event(
         self,
@@ -24,11 +264,8 @@ class AuditLogger:
         ip_address: Optional[str] = None,
         user_agent: Optional[str] = None
     ) -> str:
-        """Log an audit event."""
+        """Log an audit event (buffered once the writer is started)."""
         try:
-            db = get_mongo_db()
-            collection = db[self.collection_name]
-            
             audit_entry = {
                 "_id": str(uuid.uuid4()),
                 "event_type": event_type,
@@ -40,9 +277,12 @@ class AuditLogger:
                 "timestamp": datetime.utcnow(),
             }
             
-            collection.insert_one(audit_entry)
+            if self.writer.running:
+                self.writer.enqueue(audit_entry)
+            else:
+                get_mongo_db()[self.collection_name].insert_one(audit_entry)
             
-            logger.info(
+            logger.debug(
                 "audit_event_logged",
                 event_type=event_type,
                 user_id=user_id,
@@ -55,54 +295,160 @@ class AuditLogger:
             logger.error("audit_log_error", error=str(e))
             return None
     
+    def log_request_event(
+        self,
+        request: Request,
+        event_type: str,
+        user_id: Optional[str],
+        action: str,
+        details: Dict[str, Any]
+    ) -> str:
+        """Log an audit event with the caller's IP address and user agent."""
+        return self.log_event(
+            event_type=event_type,
+            user_id=user_id,
+            action=action,
+            details=details,
+            ip_address=request.client.host if request.client else None,
+            user_agent=request.headers.get("user-agent")
+        )
+    
+    def ensure_indexes(self) -> None:
+        """Create audit log indexes and retention policy (called at startup)."""
+        collection = get_mongo_db()[self.collection_name]
+        
+        collection.create_index(
+            [("user_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="user_id_timestamp"
+        )
+        collection.create_index(
+            [("event_type", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)],
+            name="event_type_timestamp"
+        )
+        
+        # Single-field timestamp index doubles as the TTL retention index
+        retention_seconds = settings.AUDIT_RETENTION_DAYS * 86400
+        if retention_seconds > 0:
+            try:
+                collection.create_index(
+                    [("timestamp", DESCENDING)],
+                    name="timestamp_ttl",
+                    expireAfterSeconds=retention_seconds
+                )
+            except OperationFailure:
+                # Retention changed since the index was created
+                get_mongo_db().command(
+                    "collMod",
+                    self.collection_name,
+                    index={"name": "timestamp_ttl", "expireAfterSeconds": retention_seconds}
+                )
+        else:
+            # Retention turned off: an existing TTL index would keep expiring
+            # entries (and conflicts with a plain one of the same name)
+            existing = collection.index_information().get("timestamp_ttl")
+            if existing and "expireAfterSeconds" in existing:
+                collection.drop_index("timestamp_ttl")
+            collection.create_index([("timestamp", DESCENDING)], name="timestamp_ttl")
+        
+        logger.info(
+            "audit_indexes_ensured",
+            retention_days=settings.AUDIT_RETENTION_DAYS
+        )
+    
+    def iter_audit_logs(
+        self,
+        user_id: Optional[str] = None,
+        event_type: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        batch_size: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream audit logs newest first without materializing the result.
+        
+        Documents are fetched from Mongo `batch_size` at a time; iteration
+        can resume after any entry by passing its `encode_cursor` value.
+        """
+        query: Dict[str, Any] = {}
+        if user_id:
+            query["user_id"] = user_id
+        if event_type:
+            query["event_type"] = event_type
+        if start_date or end_date:
+            query["timestamp"] = {}
+            if start_date:
+                query["timestamp"]["$gte"] = start_date
+            if end_date:
+                query["timestamp"]["$lte"] = end_date
+        
+        if cursor:
+            timestamp, entry_id = decode_cursor(cursor)
+            keyset = {"$or": [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": entry_id}}
+            ]}
+            query = {"$and": [query, keyset]} if query else keyset
+        
+        collection = get_mongo_db()[self.collection_name]
+        yield from collection.find(query).sort(
+            [("timestamp", DESCENDING), ("_id", DESCENDING)]
+        ).batch_size(batch_size)
+    
+    def get_audit_page(
+        self,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        **filters: Any
+    ) -> Dict[str, Any]:
+        """Get one page of audit logs with an opaque cursor for the next page."""
+        logs = list(itertools.islice(
+            self.iter_audit_logs(cursor=cursor, batch_size=limit + 1, **filters),
+            limit + 1
+        ))
+        
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_cursor = encode_cursor(logs[-1]["timestamp"], logs[-1]["_id"])
+        
+        return {"logs": logs, "next_cursor": next_cursor}
+    
     def get_user_audit_trail(
         self,
         user_id: str,
-        limit: int = 100
-    ) -> list:
-        """Get audit trail for a user."""
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Get a page of the audit trail for a user."""
         try:
-            db = get_mongo_db()
-            collection = db[self.collection_name]
-            
-            cursor = collection.find(
-                {"user_id": user_id}
-            ).sort("timestamp", -1).limit(limit)
-            
-            return list(cursor)
+            return self.get_audit_page(limit=limit, cursor=cursor, user_id=user_id)
             
         except Exception as e:
             logger.error("audit_trail_error", error=str(e))
-            return []
+            return {"logs": [], "next_cursor": None}
     
     def get_audit_logs(
         self,
         event_type: Optional[str] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
-        limit: int = 1000
-    ) -> list:
-        """Get audit logs with filters."""
+        limit: int = 1000,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Get a page of audit logs with filters."""
         try:
-            db = get_mongo_db()
-            collection = db[self.collection_name]
-            
-            query = {}
-            if event_type:
-                query["event_type"] = event_type
-            if start_date or end_date:
-                query["timestamp"] = {}
-                if start_date:
-                    query["timestamp"]["$gte"] = start_date
-                if end_date:
-                    query["timestamp"]["$lte"] = end_date
-            
-            cursor = collection.find(query).sort("timestamp", -1).limit(limit)
-            return list(cursor)
+            return self.get_audit_page(
+                limit=limit,
+                cursor=cursor,
+                event_type=event_type,
+                start_date=start_date,
+                end_date=end_date
+            )
             
         except Exception as e:
             logger.error("get_audit_logs_error", error=str(e))
-            return []
+            return {"logs": [], "next_cursor": None}
 
 
 # Global audit logger instance
@@ -0,0 +1,130 @@
+"""Shared worker pools for blocking and CPU-bound work."""
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from app.config import settings
+from app.utils.logger import get_logger, setup_logging
+
+logger = get_logger(__name__)
+
+
+def _init_worker_process() -> None:
+    """Configure logging in a fresh pool process (its own sink and writer thread)."""
+    setup_logging(
+        settings.DEBUG,
+        sample_rates=settings.log_sample_rates,
+        queue_size=settings.LOG_QUEUE_SIZE
+    )
+
+
+class WorkerPools:
+    """
+    Bounded thread and process pools shared by the whole app.
+    
+    Threads suit calls that release the GIL (bcrypt, Fernet, file I/O);
+    processes suit pure-Python CPU work (PDF rendering, OCR). Each pool
+    admits at most `size * queue_factor` in-flight jobs; extra callers wait
+    on a semaphore instead of piling up in the executor's unbounded queue.
+    """
+    
+    def __init__(
+        self,
+        thread_workers: int = None,
+        process_workers: int = None,
+        queue_factor: int = None
+    ):
+        """Initialize worker pools (executors are created lazily)."""
+        self.thread_workers = thread_workers or settings.THREAD_POOL_SIZE
+        self.process_workers = process_workers or settings.PROCESS_POOL_SIZE
+        queue_factor = queue_factor or settings.WORKER_QUEUE_FACTOR
+        
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._thread_slots = asyncio.Semaphore(self.thread_workers * queue_factor)
+        self._process_slots = asyncio.Semaphore(self.process_workers * queue_factor)
+    
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        """Get the thread pool, creating it on first use."""
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(
+                max_workers=self.thread_workers,
+                thread_name_prefix="loanifi-worker"
+            )
+        return self._thread_pool
+    
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        """
+        Get the process pool, creating it on first use.
+        
+        Workers are spawned rather than forked: by the time the pool is
+        created the log writer and other threads are running, and a forked
+        child would inherit their locks but not the threads themselves.
+        """
+        if self._process_pool is None:
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker_process
+            )
+        return self._process_pool
+    
+    def start(self) -> None:
+        """Create the thread pool up front (called from lifespan)."""
+        self.thread_pool
+        logger.info(
+            "worker_pools_started",
+            thread_workers=self.thread_workers,
+            process_workers=self.process_workers
+        )
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """Shut down both pools (called from lifespan)."""
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=wait)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait)
+            self._process_pool = None
+        logger.info("worker_pools_stopped")
+    
+    async def _run(
+        self,
+        executor: Executor,
+        slots: asyncio.Semaphore,
+        func: Callable[..., Any],
+        *args: Any,
+        **kwargs: Any
+    ) -> Any:
+        """Run a callable on an executor once a slot is free."""
+        async with slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                executor,
+                functools.partial(func, *args, **kwargs)
+            )
+    
+    async def run_in_thread(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking callable on the shared thread pool."""
+        return await self._run(self.thread_pool, self._thread_slots, func, *args, **kwargs)
+    
+    async def run_in_process(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a CPU-bound callable on the shared process pool (args must pickle)."""
+        return await self._run(self.process_pool, self._process_slots, func, *args, **kwargs)
+
+
+# Global worker pools instance
+worker_pools = WorkerPools()
+
+
+async def run_in_thread(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a blocking callable on the shared thread pool."""
+    return await worker_pools.run_in_thread(func, *args, **kwargs)
+
+
+async def run_in_process(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Run a CPU-bound callable on the shared process pool."""
+    return await worker_pools.run_in_process(func, *args, **kwargs)
@@ -1,39 +1,234 @@
 """Structured logging configuration."""
 import structlog
 import logging
+import atexit
+import orjson
+import os
+import queue
+import random
 import sys
-from typing import Any, Dict
+import threading
+from typing import Any, Dict, Optional, TextIO
 
 
-def setup_logging(debug: bool = False) -> None:
+class AsyncLogSink:
+    """
+    Bounded queue drained to a stream by a background thread.
+    
+    Logging on the hot path is reduced to a non-blocking `put`; when the
+    queue is full the line is dropped and counted instead of stalling the
+    event loop on stdout. A forked child gets a fresh queue and writer
+    thread (see `reset_after_fork`), since only the forking thread survives.
+    """
+    
+    def __init__(self, stream: TextIO = None, max_size: int = 10000, batch_size: int = 256):
+        """Initialize log sink and start the writer thread."""
+        self.stream = stream or sys.stdout
+        self.batch_size = batch_size
+        self.max_size = max_size
+        self.dropped = 0
+        self.sampled_out = 0
+        self._start()
+    
+    def _start(self) -> None:
+        """Create the queue, counter lock and writer thread."""
+        self.queue: queue.Queue = queue.Queue(maxsize=self.max_size)
+        self._counter_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._drain, name="log-sink", daemon=True)
+        self._thread.start()
+    
+    def reset_after_fork(self) -> None:
+        """Restart in a forked child; lines queued in the parent are the parent's to write."""
+        self.dropped = 0
+        self.sampled_out = 0
+        self._start()
+    
+    def count_dropped(self, count: int = 1) -> None:
+        """Add to the dropped-lines counter (any thread)."""
+        with self._counter_lock:
+            self.dropped += count
+    
+    def count_sampled_out(self) -> None:
+        """Add one to the sampled-out counter (any thread)."""
+        with self._counter_lock:
+            self.sampled_out += 1
+    
+    def write(self, line: str) -> None:
+        """Enqueue one rendered line."""
+        if self._stopped.is_set():
+            # Writer thread is gone; late lines (during shutdown) go straight out
+            self.stream.write(line + "\n")
+            return
+        
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            self.count_dropped()
+    
+    def _drain(self) -> None:
+        """Write queued lines in batches until stopped and empty."""
+        while not (self._stopped.is_set() and self.queue.empty()):
+            try:
+                lines = [self.queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            
+            while len(lines) < self.batch_size:
+                try:
+                    lines.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                self.stream.write("\n".join(lines) + "\n")
+                self.stream.flush()
+            except Exception:
+                self.count_dropped(len(lines))
+    
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush remaining lines and stop the writer thread."""
+        self._stopped.set()
+        self._thread.join(timeout)
+    
+    def stats(self) -> Dict[str, int]:
+        """Get queue depth and drop counters."""
+        return {
+            "queued": self.queue.qsize(),
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out
+        }
+
+
+class QueueLogger:
+    """structlog logger that hands rendered events to the sink."""
+    
+    def __init__(self, sink: AsyncLogSink):
+        self._sink = sink
+    
+    def msg(self, message: Any) -> None:
+        """Enqueue a rendered event."""
+        if isinstance(message, bytes):
+            message = message.decode()
+        self._sink.write(message)
+    
+    log = debug = info = warn = warning = error = critical = exception = fatal = msg
+
+
+class QueueLoggerFactory:
+    """Logger factory producing QueueLogger instances for one sink."""
+    
+    def __init__(self, sink: AsyncLogSink):
+        self._logger = QueueLogger(sink)
+    
+    def __call__(self, *args: Any) -> QueueLogger:
+        return self._logger
+
+
+class SinkHandler(logging.Handler):
+    """Route standard library logging through the same sink."""
+    
+    def __init__(self, sink: AsyncLogSink):
+        super().__init__()
+        self._sink = sink
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._sink.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+class EventSampler:
+    """Processor that keeps only a fraction of selected high-volume events."""
+    
+    def __init__(self, sink: AsyncLogSink, rates: Dict[str, float]):
+        self._sink = sink
+        self._rates = rates
+    
+    def __call__(self, logger: Any, method_name: str, event_dict: Dict[str, Any]) -> Dict[str, Any]:
+        rate = self._rates.get(event_dict.get("event"))
+        # Warnings and errors are never sampled
+        if rate is not None and method_name in ("debug", "info") and random.random() >= rate:
+            self._sink.count_sampled_out()
+            raise structlog.DropEvent
+        return event_dict
+
+
+def _orjson_dumps(obj: Any, **kwargs: Any) -> str:
+    """Serialize an event dict with orjson."""
+    return orjson.dumps(obj, default=str).decode()
+
+
+_sink: Optional[AsyncLogSink] = None
+
+
+def _reset_sink_after_fork() -> None:
+    """Give a forked child its own writer thread (the parent's does not survive fork)."""
+    if _sink is not None:
+        _sink.reset_after_fork()
+
+
+os.register_at_fork(after_in_child=_reset_sink_after_fork)
+
+
+def setup_logging(
+    debug: bool = False,
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: int = 10000
+) -> None:
     """Set up structured logging."""
+    global _sink
     
     log_level = logging.DEBUG if debug else logging.INFO
     
+    if _sink is None:
+        _sink = AsyncLogSink(sys.stdout, max_size=queue_size)
+        atexit.register(_sink.close)
+    
     # Configure standard logging
+    handler = SinkHandler(_sink)
+    handler.setFormatter(logging.Formatter("%(message)s"))
     logging.basicConfig(
-        format="%(message)s",
-        stream=sys.stdout,
         level=log_level,
+        handlers=[handler],
+        force=True,
     )
     
+    if debug:
+        renderer = structlog.dev.ConsoleRenderer()
+    else:
+        renderer = structlog.processors.JSONRenderer(serializer=_orjson_dumps)
+    
     # Configure structlog
     structlog.configure(
         processors=[
+            EventSampler(_sink, sample_rates or {}),
             structlog.contextvars.merge_contextvars,
             structlog.processors.add_log_level,
             structlog.processors.StackInfoRenderer(),
             structlog.dev.set_exc_info,
             structlog.processors.TimeStamper(fmt="iso"),
-            structlog.dev.ConsoleRenderer() if debug else structlog.processors.JSONRenderer()
+            renderer
         ],
         wrapper_class=structlog.make_filtering_bound_logger(log_level),
         context_class=dict,
-        logger_factory=structlog.PrintLoggerFactory(),
+        logger_factory=QueueLoggerFactory(_sink),
         cache_logger_on_first_use=True,
     )
 
 
+def shutdown_logging() -> None:
+    """Flush queued log lines (called on application shutdown)."""
+    if _sink is not None:
+        _sink.close()
+
+
+def get_log_stats() -> Dict[str, int]:
+    """Get log queue depth and drop counters."""
+    return _sink.stats() if _sink is not None else {}
+
+
 def get_logger(name: str) -> Any:
     """Get a structured logger instance."""
     return structlog.get_logger(name)
@@ -55,5 +250,3 @@ def log_audit_event(
         user_id=user_id,
         **details
     )
-
-
@@ -0,0 +1,73 @@
+"""Keyset (cursor) pagination helpers."""
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.orm import Query
+import base64
+import uuid
+
+
+def encode_cursor(sort_value: Optional[datetime], row_id: Any) -> str:
+    """Build an opaque cursor from the last row's (timestamp, id); a NULL timestamp encodes as empty."""
+    raw = f"{sort_value.isoformat() if sort_value is not None else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], str]:
+    """Decode a cursor into (timestamp or None, id). Raises ValueError if malformed."""
+    try:
+        sort_value, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return (datetime.fromisoformat(sort_value) if sort_value else None), row_id
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def keyset_page(
+    query: Query,
+    sort_column: Any,
+    id_column: Any,
+    limit: int,
+    cursor: Optional[str] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page ordered by (sort_column, id_column) descending.
+    
+    The row-value comparison `(sort, id) < (:sort, :id)` lets Postgres seek
+    straight into a matching (sort DESC, id DESC) index, so every page
+    costs the same no matter how deep it is. Rows with a NULL sort value
+    come first (Postgres' default for DESC, so the same index still
+    serves the order) and are paged by id alone.
+    
+    Returns:
+        (rows, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        try:
+            row_id = uuid.UUID(row_id)
+        except ValueError as e:
+            raise ValueError("Invalid cursor") from e
+        if sort_value is None:
+            query = query.filter(or_(
+                and_(sort_column.is_(None), id_column < row_id),
+                sort_column.isnot(None)
+            ))
+        else:
+            # NULL sort values compare as unknown, so those rows are excluded
+            query = query.filter(tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    
+    rows = query.order_by(
+        sort_column.desc().nulls_first(),
+        id_column.desc()
+    ).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            getattr(last, sort_column.key),
+            getattr(last, id_column.key)
+        )
+    
+    return rows, next_cursor
@@ -0,0 +1,180 @@
+"""Check that hot queries are served by their indexes.
+
+Usage:
+    python -m app.utils.query_plans
+
+Each query below mirrors a filter/order used by the chat, admin, documents
+or analytics code. It is EXPLAINed with sequential scans disabled, so that
+small development tables still show whether a usable index exists. The
+command exits non-zero if any query does not touch one of its expected
+indexes.
+"""
+import json
+import sys
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Set, Tuple
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.engine import Connection
+
+from app.utils.database import engine
+from app.utils.logger import get_logger
+from app.models.user import User
+from app.models.conversation import Conversation, Message, ConversationStatus
+from app.models.loan_application import LoanApplication, ApplicationStatus, Document
+
+logger = get_logger(__name__)
+
+
+def hot_queries() -> List[Tuple[str, Any, Set[str]]]:
+    """Representative queries as (name, statement, acceptable index names)."""
+    some_id = uuid.uuid4()
+    end = datetime.utcnow()
+    start = end - timedelta(days=30)
+    
+    return [
+        (
+            "conversation_messages",
+            select(Message).where(Message.conversation_id == some_id).order_by(Message.created_at),
+            {"ix_messages_conversation_id_created_at"}
+        ),
+        (
+            "user_conversations",
+            select(Conversation).where(Conversation.user_id == some_id)
+            .order_by(Conversation.started_at.desc()),
+            {"ix_conversations_user_id_started_at_id"}
+        ),
+        (
+            "admin_conversations_by_status",
+            select(Conversation).where(Conversation.status == ConversationStatus.ACTIVE)
+            .order_by(Conversation.started_at.desc()).limit(50),
+            {"ix_conversations_status_started_at_id", "ix_conversations_active"}
+        ),
+        (
+            "conversations_in_range",
+            select(Conversation.id).where(
+                Conversation.started_at >= start,
+                Conversation.started_at <= end
+            ),
+            {"ix_conversations_started_at_id", "ix_conversations_user_id_started_at_id"}
+        ),
+        (
+            "application_for_conversation",
+            select(LoanApplication).where(LoanApplication.conversation_id == some_id),
+            {"ix_loan_applications_conversation_id"}
+        ),
+        (
+            "admin_applications_by_status",
+            select(LoanApplication).where(LoanApplication.status == ApplicationStatus.SANCTIONED)
+            .order_by(LoanApplication.created_at.desc()).limit(50),
+            {"ix_loan_applications_status_created_at_id"}
+        ),
+        (
+            "applications_in_range",
+            select(LoanApplication.id).where(
+                LoanApplication.created_at >= start,
+                LoanApplication.created_at <= end
+            ),
+            {
+                "ix_loan_applications_created_at_id",
+                "ix_loan_applications_sanctioned",
+                "ix_loan_applications_funnel"
+            }
+        ),
+        (
+            "sanctioned_applications_in_range",
+            select(LoanApplication.created_at, LoanApplication.sanctioned_at).where(
+                LoanApplication.created_at >= start,
+                LoanApplication.created_at <= end,
+                LoanApplication.sanctioned_at.isnot(None)
+            ),
+            {
+                "ix_loan_applications_sanctioned",
+                "ix_loan_applications_created_at_id",
+                "ix_loan_applications_funnel"
+            }
+        ),
+        (
+            "application_funnel",
+            select(
+                func.count().filter(LoanApplication.status == ApplicationStatus.SANCTIONED),
+                func.count().filter(LoanApplication.submitted_at.isnot(None))
+            ).where(
+                LoanApplication.created_at >= start,
+                LoanApplication.created_at <= end
+            ),
+            {"ix_loan_applications_funnel"}
+        ),
+        (
+            "conversations_by_stage",
+            select(Conversation.id).where(
+                Conversation.conversation_state["stage"].astext == "qualified",
+                Conversation.started_at >= start
+            ),
+            {"ix_conversations_stage_started_at"}
+        ),
+        (
+            "admin_users_page",
+            select(User).where(
+                tuple_(User.created_at, User.id) < tuple_(end, some_id)
+            ).order_by(User.created_at.desc(), User.id.desc()).limit(50),
+            {"ix_users_created_at_id"}
+        ),
+        (
+            "application_documents",
+            select(Document).where(Document.application_id == some_id),
+            {"ix_documents_application_id_uploaded_at"}
+        ),
+        (
+            "document_content_refs",
+            select(func.count()).select_from(Document).where(Document.content_hash == "0" * 64),
+            {"ix_documents_content_hash_document_type"}
+        ),
+    ]
+
+
+def _plan_indexes(plan: Dict[str, Any]) -> Set[str]:
+    """Collect every index name referenced anywhere in a plan tree."""
+    names = set()
+    if "Index Name" in plan:
+        names.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        names |= _plan_indexes(child)
+    return names
+
+
+def explain(connection: Connection, statement: Any) -> Dict[str, Any]:
+    """Return the JSON plan for a statement."""
+    compiled = statement.compile(
+        dialect=connection.dialect,
+        compile_kwargs={"literal_binds": True}
+    )
+    raw = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}").scalar()
+    plan = raw if isinstance(raw, list) else json.loads(raw)
+    return plan[0]["Plan"]
+
+
+def check_query_plans() -> List[Dict[str, Any]]:
+    """EXPLAIN every hot query and report which indexes it uses."""
+    results = []
+    with engine.connect() as connection:
+        with connection.begin():
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            for name, statement, expected in hot_queries():
+                used = _plan_indexes(explain(connection, statement))
+                results.append({
+                    "query": name,
+                    "expected": sorted(expected),
+                    "used": sorted(used),
+                    "ok": bool(used & expected)
+                })
+    return results
+
+
+if __name__ == "__main__":
+    report = check_query_plans()
+    for row in report:
+        status = "ok  " if row["ok"] else "MISS"
+        print(f"{status} {row['query']}: uses {row['used'] or 'no index'} (expected one of {row['expected']})")
+    sys.exit(0 if all(row["ok"] for row in report) else 1)
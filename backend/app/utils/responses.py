@@ -0,0 +1,70 @@
+"""Fast JSON response class and conditional GET helpers."""
+from decimal import Decimal
+from typing import Any
+from fastapi import Request
+from fastapi import responses
+from fastapi.responses import Response
+from pydantic import BaseModel
+import hashlib
+import orjson
+
+
+def _default(obj: Any) -> Any:
+    """Serialize the types orjson does not handle natively."""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class ORJSONResponse(responses.ORJSONResponse):
+    """
+    FastAPI's orjson response, extended to serialize models, Decimals and sets.
+    
+    Used as the app's default response class. Routes that already hold
+    plain data return it wrapped in this class directly, which skips
+    FastAPI's `jsonable_encoder` pass and `response_model` re-validation
+    (the model still documents the schema).
+    """
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+
+
+def make_etag(*parts: Any) -> str:
+    """Weak ETag derived from a resource's version fields (timestamps, counters)."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Whether the request's If-None-Match already names `etag` (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def conditional_response(request: Request, etag: str, build_content) -> Response:
+    """
+    Answer a conditional GET.
+    
+    Returns a bodiless 304 when the client's copy is current; otherwise
+    calls `build_content()` and renders it with the ETag attached. Callers
+    compute `etag` from cheap version columns so unchanged polls never
+    load the full payload.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(build_content(), headers=headers)
@@ -0,0 +1,93 @@
+"""Shared fixtures: an in-memory database and a content store in a temp dir."""
+import os
+import tempfile
+import uuid
+
+# Settings are read at import time; required values and scratch storage first
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="loanifi-uploads-"))
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401  (registers every mapper)
+from app.models.loan_application import Document
+from app.services import content_store as content_store_module
+from app.services import document_service as document_service_module
+from app.services.content_store import ContentStore
+
+
+# The models use Postgres column types; SQLite stores them as JSON text / hex
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(type_, compiler, **kw):
+    return "JSON"
+
+
+@compiles(UUID, "sqlite")
+def _uuid_on_sqlite(type_, compiler, **kw):
+    return "CHAR(32)"
+
+
+_uuid_bind_processor = UUID.bind_processor
+
+
+def _bind_uuid_strings(self, dialect):
+    """Accept string ids on SQLite, as psycopg2 does (routes filter by path parameters)."""
+    process = _uuid_bind_processor(self, dialect)
+    if process is None or dialect.name != "sqlite":
+        return process
+    return lambda value: process(uuid.UUID(value) if isinstance(value, str) else value)
+
+
+UUID.bind_processor = _bind_uuid_strings
+
+
+@pytest.fixture
+def session_factory(monkeypatch):
+    """Sessions on a fresh in-memory SQLite database with the documents table."""
+    engine = create_engine(
+        "sqlite://",
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False}
+    )
+    Document.__table__.create(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # Background removals open their own sessions
+    monkeypatch.setattr(content_store_module, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    """A session, closed after the test."""
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def removals():
+    """Single worker for background removals; `drain()` waits for queued ones."""
+    executor = ThreadPoolExecutor(max_workers=1)
+    executor.drain = lambda: executor.submit(lambda: None).result(timeout=10)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def store(tmp_path, removals, monkeypatch):
+    """Content store under tmp_path, used by the document service."""
+    store = ContentStore(root=str(tmp_path / "objects"), lock_timeout=1, executor=removals)
+    # SQLite has no advisory locks; each test runs a single writer
+    monkeypatch.setattr(store, "try_lock", lambda db, digest: True)
+    monkeypatch.setattr(store, "lock", lambda db, digest: None)
+    monkeypatch.setattr(document_service_module, "content_store", store)
+    return store
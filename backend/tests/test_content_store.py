@@ -0,0 +1,201 @@
+"""Content-addressed document storage: deduplication, verification reuse, cleanup."""
+import asyncio
+import io
+import os
+import uuid
+
+import pytest
+from fastapi import UploadFile
+from starlette.requests import Request
+
+from app.models.loan_application import Document
+from app.routes import documents as documents_routes
+from app.services.document_service import document_service, SHARED_CONTENT_FLAG
+
+PAN_CARD = b"%PDF-1.4 pan card scan" * 100
+
+
+@pytest.fixture(autouse=True)
+def quiet_audit(monkeypatch):
+    """Audit events would go to MongoDB."""
+    monkeypatch.setattr(documents_routes.audit_logger, "log_event", lambda **kwargs: None)
+
+
+@pytest.fixture
+def ocr_calls(monkeypatch):
+    """Replace the (randomised) mock verification with a deterministic one; records calls."""
+    calls = []
+
+    async def verify_document(document_id, document_type):
+        calls.append(document_id)
+        return {
+            "valid": True,
+            "document_type": document_type,
+            "extracted_data": {"pan_number": "ABCDE1234F"},
+            "confidence_score": 0.93,
+            "fraud_flags": []
+        }
+
+    monkeypatch.setattr(document_service, "verify_document", verify_document)
+    return calls
+
+
+def _request() -> Request:
+    return Request({"type": "http", "method": "POST", "headers": [], "client": ("127.0.0.1", 1234)})
+
+
+def upload(db, content: bytes, user_id, document_type: str = "pan_card"):
+    """Call the upload route; returns (response, document row)."""
+    response = asyncio.run(documents_routes.upload_document(
+        request=_request(),
+        file=UploadFile(io.BytesIO(content), filename="pan.pdf"),
+        document_type=document_type,
+        user_id=user_id,
+        application_id=uuid.uuid4(),
+        db=db
+    ))
+    return response, db.get(Document, uuid.UUID(response.document_id))
+
+
+def verify(db, document: Document):
+    return asyncio.run(documents_routes.verify_document(
+        document_id=str(document.id), request=_request(), db=db
+    ))
+
+
+def delete(db, document: Document):
+    return asyncio.run(documents_routes.delete_document(
+        document_id=str(document.id), request=_request(), db=db
+    ))
+
+
+def stored_objects(store) -> list:
+    return [name for _, _, names in os.walk(store.root) for name in names]
+
+
+def test_reupload_is_deduplicated(db, store):
+    user_id = uuid.uuid4()
+    first, first_doc = upload(db, PAN_CARD, user_id)
+    second, second_doc = upload(db, PAN_CARD, user_id)
+
+    assert not first.deduplicated
+    assert second.deduplicated
+    assert first_doc.file_path == second_doc.file_path == store.path_for(first_doc.content_hash)
+    assert stored_objects(store) == [first_doc.content_hash]
+
+
+def test_verification_reused_for_same_user(db, store, ocr_calls):
+    user_id = uuid.uuid4()
+    _, first_doc = upload(db, PAN_CARD, user_id)
+    verify(db, first_doc)
+
+    response, second_doc = upload(db, PAN_CARD, user_id)
+
+    assert ocr_calls == [str(first_doc.id)]
+    assert "previous verification reused" in response.message
+    assert second_doc.is_verified
+    assert second_doc.extracted_data == first_doc.extracted_data
+    assert not second_doc.is_suspicious
+
+
+def test_verification_not_reused_across_users(db, store, ocr_calls):
+    _, first_doc = upload(db, PAN_CARD, uuid.uuid4())
+    verify(db, first_doc)
+
+    response, other_doc = upload(db, PAN_CARD, uuid.uuid4())
+
+    assert response.deduplicated
+    assert not other_doc.is_verified
+    assert other_doc.is_suspicious
+    assert SHARED_CONTENT_FLAG in other_doc.fraud_flags
+
+    # Verifying runs the full checks and keeps the flag
+    result = verify(db, other_doc)
+    assert ocr_calls == [str(first_doc.id), str(other_doc.id)]
+    assert SHARED_CONTENT_FLAG in result.fraud_flags
+    assert other_doc.is_suspicious
+
+
+def test_delete_keeps_shared_object_until_last_reference(db, store, removals):
+    user_id = uuid.uuid4()
+    _, first_doc = upload(db, PAN_CARD, user_id)
+    _, second_doc = upload(db, PAN_CARD, user_id)
+    path = first_doc.file_path
+
+    delete(db, first_doc)
+    removals.drain()
+    assert os.path.exists(path)
+
+    delete(db, second_doc)
+    removals.drain()
+    assert not os.path.exists(path)
+    assert stored_objects(store) == []
+
+
+def test_new_object_removed_when_transaction_rolls_back(db, store, removals):
+    result = asyncio.run(document_service.save_document(
+        db=db,
+        file=UploadFile(io.BytesIO(PAN_CARD), filename="pan.pdf"),
+        filename="pan.pdf",
+        document_type="pan_card",
+        user_id=str(uuid.uuid4())
+    ))
+    assert os.path.exists(result["file_path"])
+
+    # The Document row never gets committed
+    db.rollback()
+    removals.drain()
+
+    assert not os.path.exists(result["file_path"])
+
+
+def test_existing_object_kept_when_reupload_rolls_back(db, store, removals):
+    _, document = upload(db, PAN_CARD, uuid.uuid4())
+
+    result = asyncio.run(document_service.save_document(
+        db=db,
+        file=UploadFile(io.BytesIO(PAN_CARD), filename="pan.pdf"),
+        filename="pan.pdf",
+        document_type="pan_card",
+        user_id=str(uuid.uuid4())
+    ))
+    db.rollback()
+    removals.drain()
+
+    assert result["deduplicated"]
+    assert os.path.exists(document.file_path)
+
+
+def test_acquire_waits_without_blocking_the_event_loop(tmp_path):
+    from app.services.content_store import ContentStore
+
+    store = ContentStore(root=str(tmp_path), lock_timeout=0.5)
+    held = set()
+
+    def try_lock(db, digest):
+        if digest in held:
+            return False
+        held.add(digest)
+        return True
+
+    store.try_lock = try_lock
+    order = []
+
+    async def holder():
+        await store.acquire(None, "abc")
+        await asyncio.sleep(0.1)  # e.g. writing the file; the loop must keep running
+        order.append("holder")
+        held.discard("abc")
+
+    async def waiter():
+        await asyncio.sleep(0.01)
+        await store.acquire(None, "abc")
+        order.append("waiter")
+
+    async def main():
+        await asyncio.gather(holder(), waiter())
+        with pytest.raises(TimeoutError):
+            await store.acquire(None, "abc")
+
+    asyncio.run(main())
+    assert order == ["holder", "waiter"]
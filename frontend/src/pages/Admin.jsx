@@ -171,7 +171,7 @@ function ApplicationsList() {
     queryFn: () => adminAPI.getApplications({ limit: 50 }),
   })
 
-  const applications = data?.data || []
+  const applications = data?.data?.applications || []
 
   if (isLoading) {
     return <div className="text-center py-12">Loading...</div>